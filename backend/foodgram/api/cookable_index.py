@@ -0,0 +1,116 @@
+import threading
+from array import array
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from recipe.cache import get_version
+from recipe.models import Recipe, RecipeDeletion, RecipeIngredient
+
+# Запас по времени при догрузке изменений: транзакция могла записать
+# updated_at раньше, чем закоммитилась.
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+class CookableIndex:
+    """Обратный индекс «ингредиент → рецепты» в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта — набор его ингредиентов.
+    """
+
+    def __init__(self):
+        self.recipes = {}
+        self.postings = {}
+        self.loaded_at = None
+
+    def load(self):
+        self.loaded_at = timezone.now()
+        rows = RecipeIngredient.objects.values_list('recipe_id',
+                                                    'ingredient_id')
+        recipes = defaultdict(list)
+        postings = defaultdict(list)
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=5000):
+            recipes[recipe_id].append(ingredient_id)
+            postings[ingredient_id].append(recipe_id)
+        self.recipes = {pk: frozenset(items) for pk, items in recipes.items()}
+        self.postings = {pk: array('q', sorted(items))
+                         for pk, items in postings.items()}
+
+    def refresh(self):
+        """Догружает рецепты, изменённые и удалённые с прошлой загрузки."""
+        since = self.loaded_at - REFRESH_OVERLAP
+        self.loaded_at = timezone.now()
+        if since < self.loaded_at - RecipeDeletion.RETENTION:
+            # Часть отметок об удалении могла быть уже стёрта.
+            return self.load()
+        changed = {pk: set() for pk in Recipe.objects.filter(
+            updated_at__gte=since).values_list('id', flat=True)}
+        if len(changed) > len(self.recipes) // 10:
+            # Изменилась заметная часть рецептов: перечитать всё дешевле.
+            return self.load()
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=list(changed)).values_list('recipe_id',
+                                                         'ingredient_id'):
+            changed[recipe_id].add(ingredient_id)
+        for pk in RecipeDeletion.objects.filter(
+                deleted_at__gte=since).values_list('recipe_id', flat=True):
+            changed[pk] = set()
+        self.apply(changed)
+
+    def apply(self, changed):
+        affected = set()
+        for pk, ingredients in changed.items():
+            affected |= self.recipes.get(pk, frozenset()) ^ ingredients
+            if ingredients:
+                self.recipes[pk] = frozenset(ingredients)
+            else:
+                self.recipes.pop(pk, None)
+        for ingredient_id in affected:
+            recipe_ids = {pk for pk in self.postings.get(ingredient_id, ())
+                          if pk not in changed}
+            recipe_ids.update(pk for pk, ingredients in changed.items()
+                              if ingredient_id in ingredients)
+            if recipe_ids:
+                self.postings[ingredient_id] = array('q', sorted(recipe_ids))
+            else:
+                self.postings.pop(ingredient_id, None)
+
+    def search(self, ingredient_ids):
+        """Рецепты, в которых есть хотя бы один из ингредиентов.
+
+        Возвращает тройки (id рецепта, сколько не хватает, доля имеющихся)
+        по возрастанию числа недостающих, затем по убыванию доли.
+        """
+        hits = Counter()
+        for ingredient_id in set(ingredient_ids):
+            hits.update(self.postings.get(ingredient_id, ()))
+        result = []
+        for pk, count in hits.items():
+            size = len(self.recipes.get(pk, ()))
+            if size < count:
+                continue
+            result.append((pk, size - count, count / size))
+        result.sort(key=lambda item: (item[1], -item[2], -item[0]))
+        return result
+
+
+_index = None
+_version = None
+_lock = threading.Lock()
+
+
+def get_cookable_index():
+    global _index, _version
+    version = get_version('recipes:changes')
+    if _index is None or _version != version:
+        with _lock:
+            if _index is None:
+                index = CookableIndex()
+                index.load()
+                _index = index
+            elif _version != version:
+                _index.refresh()
+            _version = version
+    return _index
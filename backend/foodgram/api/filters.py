@@ -1,29 +1,84 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
-from recipe.models import Recipe, Tag
+from recipe.search import search as search_recipes
+from recipe.models import (
+    FavoritesList,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+    Tag,
+)
 
 
 class RecipeFilter(FilterSet):
+    """Фильтры рецептов.
+
+    Связи проверяются подзапросами EXISTS, а не JOIN, поэтому рецепт с
+    несколькими подходящими тегами не дублируется и DISTINCT не нужен.
+    """
+
     tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
                                              to_field_name='slug',
-                                             queryset=Tag.objects.all())
+                                             queryset=Tag.objects.all(),
+                                             method='tags_filter')
     is_favorited = filters.BooleanFilter(
         method='is_favorited_filter')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter')
+    search = filters.CharFilter(method='search_filter')
+    exclude_ingredients = filters.ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(),
+        method='exclude_ingredients_filter')
+    include_all_ingredients = filters.ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(),
+        method='include_all_ingredients_filter')
+    cooking_time__lte = filters.NumberFilter(field_name='cooking_time',
+                                             lookup_expr='lte')
+    cooking_time__gte = filters.NumberFilter(field_name='cooking_time',
+                                             lookup_expr='gte')
+    ordering = filters.ChoiceFilter(choices=(('trending', 'trending'),),
+                                    method='ordering_filter')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author',)
 
+    def tags_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value)))
+
     def is_favorited_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorite_recipe__user=user)
+            return queryset.filter(Exists(FavoritesList.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
         return queryset
 
     def is_in_shopping_cart_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shopping_recipe__user=user)
+            return queryset.filter(Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
+        return queryset
+
+    def exclude_ingredients_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(~Exists(RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__in=value)))
+
+    def include_all_ingredients_filter(self, queryset, name, value):
+        for ingredient in value:
+            queryset = queryset.filter(Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient=ingredient)))
         return queryset
+
+    def search_filter(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def ordering_filter(self, queryset, name, value):
+        return queryset.order_by('-trending_score', '-pub_date', '-id')
@@ -0,0 +1,122 @@
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.db.models import Max
+
+from recipe.cache import get_version
+from recipe.models import Ingredient
+
+FUZZY_THRESHOLD = 0.3
+FUZZY_LIMIT = 20
+
+
+def normalize(text):
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+def trigrams(text):
+    result = set()
+    for word in text.split():
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Результаты ранжируются так: совпадение с началом названия, затем с
+    началом любого слова, затем нечёткое совпадение по триграммам.
+    """
+
+    def __init__(self, ingredients):
+        ingredients = sorted(ingredients,
+                             key=lambda item: normalize(item['name']))
+        self.items = ingredients
+        self.names = [normalize(item['name']) for item in ingredients]
+        self.words = sorted(
+            (word, position)
+            for position, name in enumerate(self.names)
+            for word in set(name.split()[1:])
+        )
+        self.trigrams = defaultdict(list)
+        self.sizes = []
+        for position, name in enumerate(self.names):
+            name_trigrams = trigrams(name)
+            self.sizes.append(len(name_trigrams))
+            for trigram in name_trigrams:
+                self.trigrams[trigram].append(position)
+
+    def search(self, query):
+        query = normalize(query)
+        if not query:
+            return list(self.items)
+        positions = self.prefix_matches(query)
+        positions += self.word_prefix_matches(query, set(positions))
+        positions += self.fuzzy_matches(query, set(positions))
+        return [self.items[position] for position in positions]
+
+    def prefix_matches(self, query):
+        positions = []
+        start = bisect_left(self.names, query)
+        for position in range(start, len(self.names)):
+            if not self.names[position].startswith(query):
+                break
+            positions.append(position)
+        return positions
+
+    def word_prefix_matches(self, query, seen):
+        positions = set()
+        start = bisect_left(self.words, (query,))
+        for index in range(start, len(self.words)):
+            word, position = self.words[index]
+            if not word.startswith(query):
+                break
+            positions.add(position)
+        return sorted(positions - seen)
+
+    def fuzzy_matches(self, query, seen):
+        query_trigrams = trigrams(query)
+        hits = Counter()
+        for trigram in query_trigrams:
+            hits.update(self.trigrams.get(trigram, ()))
+        scored = []
+        for position, count in hits.items():
+            if position in seen:
+                continue
+            similarity = count / (len(query_trigrams)
+                                  + self.sizes[position] - count)
+            if similarity >= FUZZY_THRESHOLD:
+                scored.append((-similarity, position))
+        return [position for _, position in sorted(scored)[:FUZZY_LIMIT]]
+
+
+_index = None
+_version = None
+_lock = threading.Lock()
+
+
+def get_stamp():
+    """Метка версии и наибольший id ингредиента.
+
+    Загрузка из другого процесса (load_ingredients) только добавляет
+    строки и видна по MAX(id) — это один проход по первичному ключу, а
+    не подсчёт всей таблицы. Правки и удаления повышают метку версии.
+    """
+    return (get_version('ingredients'),
+            Ingredient.objects.aggregate(last=Max('id'))['last'])
+
+
+def get_ingredient_index():
+    global _index, _version
+    version = get_stamp()
+    if _index is None or _version != version:
+        with _lock:
+            if _index is None or _version != version:
+                _index = IngredientIndex(
+                    Ingredient.objects.values('id', 'name',
+                                              'measurement_unit')
+                )
+                _version = version
+    return _index
@@ -0,0 +1,230 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from recipe.cache import get_version, get_versions, persistent_cache
+from .viewer import get_viewer
+
+
+class ViewerStateMixin:
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            get_viewer(self.request).track(page)
+        return page
+
+
+class ReferenceCacheMixin:
+    """Кэширует готовый JSON справочника под ключом его версии.
+
+    Версия меняется сигналами при изменении данных, поэтому ответ 304
+    на If-None-Match отдаётся без обращения к базе.
+    """
+
+    reference_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve,
+                                    *args, **kwargs)
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        key = 'reference:{}:{}:{}'.format(
+            self.reference_name,
+            get_version(self.reference_name),
+            request.get_full_path(),
+        )
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = JSONRenderer().render(response.data)
+            etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+            cached = (etag, content)
+            cache.set(key, cached, settings.REFERENCE_CACHE_TIMEOUT)
+        etag, content = cached
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+
+def count_cache_access(outcome):
+    key = f'anonymous_cache:{outcome}'
+    persistent_cache.add(key, 0, None)
+    try:
+        persistent_cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_cache_stats():
+    hits = persistent_cache.get('anonymous_cache:hits', 0)
+    misses = persistent_cache.get('anonymous_cache:misses', 0)
+    return {'hits': hits, 'misses': misses}
+
+
+class AnonymousCacheMixin:
+    """Кэширует ответы list и retrieve для анонимных пользователей.
+
+    Вместе с ответом сохраняются версии его зависимостей (рецепты, авторы,
+    теги). Сигналы повышают версии при изменениях, и устаревшая запись
+    перестаёт совпадать. Дата изменения last_modified тоже сохраняется,
+    чтобы заголовок Last-Modified не зависел от попадания в кэш.
+    """
+
+    ignored_params = ('is_favorited', 'is_in_shopping_cart')
+    pagination_params = ('page', 'limit', 'cursor', 'pagination')
+
+    def list(self, request, *args, **kwargs):
+        return self.anonymous_cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.anonymous_cached(request, super().retrieve,
+                                     *args, **kwargs)
+
+    def anonymous_cached(self, request, handler, *args, **kwargs):
+        if (request.user.is_authenticated
+           or request.accepted_renderer.format != 'json'):
+            return handler(request, *args, **kwargs)
+        params = self.normalized_params(request)
+        key = 'anonymous_response:{}'.format(hashlib.md5(repr((
+            f'{request.path}?{urlencode(params)}',
+            self.get_cache_variant(request),
+        )).encode()).hexdigest())
+        cached = cache.get(key)
+        if cached is not None:
+            dependencies, content, last_modified = cached
+            if get_versions(dependencies) == dependencies:
+                count_cache_access('hits')
+                self.last_modified = last_modified
+                return self.cached_response(content, 'HIT')
+        count_cache_access('misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        content = JSONRenderer().render(response.data)
+        dependencies = get_versions(
+            self.get_cache_dependencies(params, response.data)
+        )
+        cache.set(key, (dependencies, content,
+                        getattr(self, 'last_modified', None)),
+                  settings.ANONYMOUS_CACHE_TIMEOUT)
+        return self.cached_response(content, 'MISS')
+
+    def normalized_params(self, request):
+        return [
+            (name, value)
+            for name in sorted(request.query_params)
+            if name not in self.ignored_params
+            for value in sorted(request.query_params.getlist(name))
+        ]
+
+    def get_cache_variant(self, request):
+        """Состояние из базы, которое не отражается в метках версий."""
+        return None
+
+    def get_cache_dependencies(self, params, data):
+        names = {'tags', 'ingredients'}
+        if self.action == 'list':
+            items = data['results'] if 'results' in data else data
+            names.update(self.membership_dependencies(params))
+        else:
+            items = [data]
+        for item in items:
+            names.add(f'recipe:{item["id"]}')
+            names.add(f'author:{item["author"]["id"]}')
+        return names
+
+    def membership_dependencies(self, params):
+        filters = {name for name, _ in params} - set(self.pagination_params)
+        names = ['trending'] if 'ordering' in filters else []
+        filters.discard('ordering')
+        if filters - {'author', 'tags'}:
+            return names + ['recipes:changes']
+        if not filters:
+            return names + ['recipes']
+        return names + [
+            '{}:{}'.format('tag' if name == 'tags' else 'author', value)
+            for name, value in params if name in filters
+        ]
+
+    def cached_response(self, content, outcome):
+        response = HttpResponse(content, content_type='application/json')
+        response['X-Cache'] = outcome
+        return response
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на условные GET-запросы до сериализации.
+
+    Наследник возвращает из get_list_state и get_object_state части ETag —
+    метки версий из кэша, так что ETag считается без обращения к базе.
+    Дату изменения get_last_modified получает одним лёгким запросом и
+    только для запросов с If-Modified-Since.
+    """
+
+    last_modified = None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, self.get_list_state(request),
+                                super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, self.get_object_state(request),
+                                super().retrieve, *args, **kwargs)
+
+    def conditional(self, request, parts, handler, *args, **kwargs):
+        if parts is None:
+            return handler(request, *args, **kwargs)
+        etag = '"{}"'.format(hashlib.md5(
+            repr((request.get_full_path(), request.accepted_renderer.format,
+                  *parts)).encode()
+        ).hexdigest())
+        use_last_modified = self.use_last_modified(request)
+        if (use_last_modified
+           and 'HTTP_IF_MODIFIED_SINCE' in request.META
+           and 'HTTP_IF_NONE_MATCH' not in request.META):
+            self.last_modified = self.get_last_modified(request)
+        response = get_conditional_response(
+            request, etag=etag,
+            last_modified=self.timestamp(self.last_modified),
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if use_last_modified and self.last_modified:
+            response['Last-Modified'] = http_date(
+                self.timestamp(self.last_modified))
+        return response
+
+    @staticmethod
+    def timestamp(value):
+        return int(value.timestamp()) if value else None
+
+    def use_last_modified(self, request):
+        return not request.user.is_authenticated
+
+    def get_list_state(self, request):
+        return None
+
+    def get_object_state(self, request):
+        return None
+
+    def get_last_modified(self, request):
+        return None
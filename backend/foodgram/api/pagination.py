@@ -0,0 +1,106 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class LimitPageNumberPagination(PageNumberPagination):
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class RecipeCursorPagination(BasePagination):
+    """Постраничная выдача рецептов по ключу (pub_date, id).
+
+    В отличие от PageNumberPagination не выполняет COUNT(*) и OFFSET,
+    поэтому глубокие страницы отдаются так же быстро, как первая.
+    """
+
+    ordering = ('-pub_date', '-id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        reverse = False
+        if cursor is not None:
+            pub_date, pk, reverse = cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date)
+                    | Q(pub_date=pub_date, id__gt=pk)
+                ).filter(pub_date__gte=pub_date).order_by('pub_date', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date)
+                    | Q(pub_date=pub_date, id__lt=pk)
+                ).filter(pub_date__lte=pub_date)
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.next = self.previous = None
+        if results:
+            first, last = results[0], results[-1]
+            if has_more or reverse:
+                self.next = self.encode_cursor(last, reverse=False)
+            if (has_more and reverse) or (cursor and not reverse):
+                self.previous = self.encode_cursor(first, reverse=True)
+        return results
+
+    def keeps_order(self, queryset):
+        """Курсор не меняет порядок, заданный фильтрами выборки."""
+        order_by = tuple(queryset.query.order_by)
+        return not order_by or order_by == self.ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.REST_FRAMEWORK['PAGE_SIZE']
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, pk, reverse = (
+                urlsafe_b64decode(encoded.encode()).decode().split('|')
+            )
+            pub_date = parse_datetime(pub_date)
+            if pub_date is None:
+                raise ValueError
+            return pub_date, int(pk), reverse == '1'
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe, reverse):
+        cursor = '{}|{}|{}'.format(recipe.pub_date.isoformat(), recipe.id,
+                                   int(reverse))
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            urlsafe_b64encode(cursor.encode()).decode(),
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.next),
+            ('previous', self.previous),
+            ('results', data),
+        ]))
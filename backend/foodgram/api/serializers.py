@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import transaction
 from djoser.serializers import UserSerializer, UserCreateSerializer
 from django.core import exceptions as django_exceptions
@@ -5,17 +6,29 @@ from django.contrib.auth.password_validation import validate_password
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
+from recipe import shopping_cart
+from recipe.images import FORMATS, VARIANTS, variant_name
+from recipe.signals import batch_recipe_changes
 from recipe.validators import validate_username
+from .viewer import get_viewer
 from recipe.models import (
     Ingredient,
     Recipe,
     RecipeIngredient,
-    Subscribe,
+    ShoppingCartIngredient,
+    ShoppingList,
     Tag,
     User,
 )
 
 
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
+
+
 class UserGetSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -27,10 +40,8 @@ class UserGetSerializer(UserSerializer):
             'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        if (self.context.get('request')
-           and not self.context['request'].user.is_anonymous):
-            return Subscribe.objects.filter(user=self.context['request'].user,
-                                            author=obj).exists()
+        if self.context.get('request'):
+            return get_viewer(self.context['request']).is_subscribed(obj.id)
         return False
 
 
@@ -49,21 +60,59 @@ class UserPostSerializer(UserCreateSerializer):
         return validate_username(username)
 
 
+class ImageSrcsetField(serializers.ReadOnlyField):
+    """srcset копий картинки по ширинам, записанным при их создании."""
+
+    def __init__(self, **kwargs):
+        super().__init__(source='*', **kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image or not recipe.image_widths:
+            return {}
+        request = self.context.get('request')
+        storage = recipe.image.storage
+        srcset = {}
+        for extension in FORMATS:
+            sources = []
+            seen = set()
+            for variant in VARIANTS:
+                # Маленькая картинка даёт копии одной ширины.
+                width = recipe.image_widths.get(variant)
+                if width is None or width in seen:
+                    continue
+                seen.add(width)
+                url = storage.url(
+                    variant_name(recipe.image.name, variant, extension))
+                if request:
+                    url = request.build_absolute_uri(url)
+                sources.append(f'{url} {width}w')
+            srcset[extension] = ', '.join(sources)
+        return srcset
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField(read_only=True)
+    image_srcset = ImageSrcsetField()
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'name',
-                  'image', 'cooking_time')
+                  'image', 'image_srcset', 'cooking_time')
+
+
+class SimilarRecipeSerializer(RecipeSerializer):
+    similarity = serializers.ReadOnlyField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('similarity',)
 
 
 class SubscribeGetSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -73,31 +122,20 @@ class SubscribeGetSerializer(serializers.ModelSerializer):
                   'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
-        return (
-            self.context.get('request').user.is_authenticated
-            and Subscribe.objects.filter(user=self.context['request'].user,
-                                         author=obj).exists()
-        )
+        return get_viewer(self.context['request']).is_subscribed(obj.id)
 
     def get_recipes(self, obj):
-        subscribed_authors = Subscribe.objects.filter(
-            user=self.context['request'].user).values_list('author', flat=True)
-        recipes = Recipe.objects.filter(author__in=subscribed_authors)
-        serializer = RecipeSerializer(recipes, many=True, read_only=True)
+        serializer = RecipeSerializer(obj.recipes.all(), many=True,
+                                      read_only=True)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        subscribed_authors = Subscribe.objects.filter(
-            user=self.context['request'].user).values_list('author', flat=True)
-        return Recipe.objects.filter(author__in=subscribed_authors).count()
-
 
 class SubscribePostSerializer(serializers.ModelSerializer):
     email = serializers.ReadOnlyField()
     username = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -114,20 +152,16 @@ class SubscribePostSerializer(serializers.ModelSerializer):
         return value
 
     def get_is_subscribed(self, obj):
-        return (
-            self.context.get('request').user.is_authenticated
-            and Subscribe.objects.filter(user=self.context['request'].user,
-                                         author=obj).exists()
-        )
+        return get_viewer(self.context['request']).is_subscribed(obj.id)
 
     def get_recipes(self, obj):
         recipes = Recipe.objects.filter(author=obj)
+        recipes_limit = get_recipes_limit(self.context['request'])
+        if recipes_limit:
+            recipes = recipes[:recipes_limit]
         serializer = RecipeSerializer(recipes, many=True, read_only=True)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
-
 
 class PasswordSerializer(serializers.Serializer):
     current_password = serializers.CharField()
@@ -157,6 +191,14 @@ class PasswordSerializer(serializers.Serializer):
         return validated_data
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_ACTION_LIMIT,
+    )
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
@@ -182,6 +224,19 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
                   'measurement_unit', 'amount')
 
 
+class ShoppingCartIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingCartIngredient
+        fields = ('id', 'name',
+                  'measurement_unit', 'amount')
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     author = UserGetSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
@@ -191,26 +246,29 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author',
                   'ingredients', 'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_srcset', 'text', 'cooking_time')
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        user = request.user
-        if user.is_anonymous:
-            return False
-        return obj.favorite_recipe.filter(user=user).exists()
+        return get_viewer(self.context['request']).is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        user = request.user
-        if user.is_anonymous:
-            return False
-        return obj.shopping_recipe.filter(user=user).exists()
+        return get_viewer(self.context['request']).is_in_shopping_cart(
+            obj.id)
+
+
+class CookableRecipeSerializer(RecipeReadSerializer):
+    missing_ingredients = serializers.ReadOnlyField()
+    coverage = serializers.ReadOnlyField()
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ('missing_ingredients',
+                                                     'coverage')
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
@@ -266,10 +324,20 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингредиенты должны быть уникальны.'
             )
+        unknown = set(ingredient_ids) - set(
+            Ingredient.objects.filter(id__in=ingredient_ids)
+            .values_list('id', flat=True)
+        )
+        if unknown:
+            raise serializers.ValidationError(
+                {'ingredients': 'Несуществующие ингредиенты: {}.'.format(
+                    ', '.join(map(str, sorted(unknown))))}
+            )
 
         return attrs
 
     @transaction.atomic
+    @batch_recipe_changes()
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -280,6 +348,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return recipe
 
     @transaction.atomic
+    @batch_recipe_changes()
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -293,16 +362,35 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return instance
 
     def create_recipe_ingredients(self, instance, ingredients):
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        recipe_ingredients = [
-            RecipeIngredient(
-                recipe=instance,
-                ingredient_id=ingredient['id'],
-                amount=ingredient['amount']
-            )
-            for ingredient in ingredients
+        """Приводит ингредиенты рецепта к переданным, меняя только разницу."""
+        current = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=instance)
+        }
+        old_amounts = {pk: item.amount for pk, item in current.items()}
+        new_amounts = {item['id']: item['amount'] for item in ingredients}
+        changed = []
+        for pk, amount in new_amounts.items():
+            if pk in current and current[pk].amount != amount:
+                current[pk].amount = amount
+                changed.append(current[pk])
+        created = [
+            RecipeIngredient(recipe=instance, ingredient_id=pk, amount=amount)
+            for pk, amount in new_amounts.items() if pk not in current
         ]
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        removed = [pk for pk in current if pk not in new_amounts]
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=instance, ingredient_id__in=removed).delete()
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        RecipeIngredient.objects.bulk_create(created)
+        if changed or created or removed:
+            shopping_cart.change_recipe(
+                ShoppingList.objects.filter(recipe=instance)
+                .values_list('user_id', flat=True),
+                old_amounts,
+                new_amounts,
+            )
 
     def to_representation(self, instance):
         return RecipeReadSerializer(instance, context=self.context).data
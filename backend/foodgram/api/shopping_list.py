@@ -0,0 +1,68 @@
+import csv
+import io
+import json
+from itertools import groupby
+
+from recipe.models import ShoppingCartIngredient
+
+CHUNK_SIZE = 2000
+
+
+def shopping_list_rows(user):
+    return (
+        ShoppingCartIngredient.objects
+        .filter(user=user)
+        .order_by('ingredient__measurement_unit', 'ingredient__name')
+        .values_list('ingredient__measurement_unit', 'ingredient__name',
+                     'amount')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def by_unit(rows):
+    return groupby(rows, key=lambda row: row[0])
+
+
+def render_txt(rows):
+    yield 'Cписок покупок:\n'
+    for unit, group in by_unit(rows):
+        yield f'\n{unit}:\n'
+        for _, name, amount in group:
+            yield f'{name} - {amount} {unit}.\n'
+
+
+def render_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('measurement_unit', 'name', 'amount'))
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 8192:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def render_json(rows):
+    yield '['
+    for index, (unit, group) in enumerate(by_unit(rows)):
+        ingredients = [{'name': name, 'amount': amount}
+                       for _, name, amount in group]
+        yield '{}{}'.format(',' if index else '', json.dumps(
+            {'measurement_unit': unit, 'ingredients': ingredients},
+            ensure_ascii=False,
+        ))
+    yield ']'
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'json': render_json,
+}
+
+
+def render_shopping_list(user, format):
+    for chunk in RENDERERS[format](shopping_list_rows(user)):
+        yield chunk.encode()
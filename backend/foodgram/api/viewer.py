@@ -0,0 +1,68 @@
+from recipe.models import FavoritesList, Recipe, ShoppingList, Subscribe, User
+
+
+class LazyIdSet:
+    """Множество id, которое подгружается одним запросом по требованию.
+
+    Запрашиваются только id, отмеченные через track() (объекты текущей
+    страницы), плюс id, о которых спросили впервые.
+    """
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.pending = set()
+        self.checked = set()
+        self.found = set()
+
+    def track(self, ids):
+        self.pending.update(set(ids) - self.checked)
+
+    def __contains__(self, pk):
+        if pk not in self.checked:
+            self.pending.add(pk)
+            self.found.update(
+                self.queryset
+                .filter(**{f'{self.field}__in': self.pending})
+                .values_list(self.field, flat=True)
+            )
+            self.checked.update(self.pending)
+            self.pending = set()
+        return pk in self.found
+
+
+class ViewerState:
+    """Подписки, избранное и корзина пользователя в рамках одного запроса."""
+
+    def __init__(self, user):
+        self.user = user
+        self.subscriptions = LazyIdSet(
+            Subscribe.objects.filter(user_id=user.id), 'author_id')
+        self.favorites = LazyIdSet(
+            FavoritesList.objects.filter(user_id=user.id), 'recipe_id')
+        self.shopping_cart = LazyIdSet(
+            ShoppingList.objects.filter(user_id=user.id), 'recipe_id')
+
+    def track(self, objects):
+        for obj in objects:
+            if isinstance(obj, User):
+                self.subscriptions.track([obj.id])
+            elif isinstance(obj, Recipe):
+                self.subscriptions.track([obj.author_id])
+                self.favorites.track([obj.id])
+                self.shopping_cart.track([obj.id])
+
+    def is_subscribed(self, author_id):
+        return self.user.is_authenticated and author_id in self.subscriptions
+
+    def is_favorited(self, recipe_id):
+        return self.user.is_authenticated and recipe_id in self.favorites
+
+    def is_in_shopping_cart(self, recipe_id):
+        return self.user.is_authenticated and recipe_id in self.shopping_cart
+
+
+def get_viewer(request):
+    if getattr(request, 'viewer', None) is None:
+        request.viewer = ViewerState(request.user)
+    return request.viewer
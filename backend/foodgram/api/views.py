@@ -1,41 +1,110 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import (
+    Max,
+    OuterRef,
+    Prefetch,
+    Subquery,
+)
+from django.db import IntegrityError
+from django.http import (
+    Http404,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status, viewsets, mixins, filters
+from rest_framework import status, viewsets, mixins
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import (
+    AllowAny,
+    IsAdminUser,
+    IsAuthenticated,
+)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from foodgram.settings import SHOPPING_LIST_FILENAME
+from recipe import interactions, similarity
+from recipe.cache import get_version, get_versions
+from recipe.signals import batch_recipe_changes
+from recipe.timeline import feed_queryset
 from .filters import RecipeFilter
+from .cookable_index import get_cookable_index
+from .ingredient_index import get_ingredient_index
+from .mixins import (
+    AnonymousCacheMixin,
+    ConditionalGetMixin,
+    ReferenceCacheMixin,
+    ViewerStateMixin,
+    get_cache_stats,
+)
+from .pagination import LimitPageNumberPagination, RecipeCursorPagination
 from recipe.models import (
     FavoritesList,
     Ingredient,
     Recipe,
     RecipeIngredient,
+    ShoppingCartIngredient,
     ShoppingList,
     Subscribe,
     Tag,
     User,
 )
 from .permissions import IsAuthorOrReadOnly
+from .renderers import CSVRenderer, PlainTextRenderer
 from .serializers import (
+    BulkIdsSerializer,
+    CookableRecipeSerializer,
     IngredientSerializer,
     RecipeSerializer,
     RecipeCreateSerializer,
     RecipeReadSerializer,
+    ShoppingCartIngredientSerializer,
+    SimilarRecipeSerializer,
     SubscribeGetSerializer,
     SubscribePostSerializer,
     TagSerializer,
     UserGetSerializer,
     UserPostSerializer,
     PasswordSerializer,
+    get_recipes_limit,
 )
+from .shopping_list import render_shopping_list
+from .viewer import get_viewer
 
 
-class UserViewSet(mixins.CreateModelMixin,
+def bulk_change(request, model, targets):
+    """Пакетно добавляет или удаляет связи пользователя с объектами.
+
+    Возвращает статус по каждому id: created, exists, deleted, absent
+    или not_found.
+    """
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    found = set(targets.filter(pk__in=ids).values_list('pk', flat=True))
+    valid = [pk for pk in ids if pk in found]
+    if request.method == 'POST':
+        changed = interactions.bulk_add(model, request.user, valid)
+        statuses = ('created', 'exists')
+    else:
+        changed = interactions.bulk_remove(model, request.user, valid)
+        statuses = ('deleted', 'absent')
+    changed = set(changed)
+    results = []
+    for pk in ids:
+        if pk not in found:
+            result = 'not_found'
+        else:
+            result = statuses[0] if pk in changed else statuses[1]
+        results.append({'id': pk, 'status': result})
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class UserViewSet(ViewerStateMixin,
+                  mixins.CreateModelMixin,
                   mixins.ListModelMixin,
                   mixins.RetrieveModelMixin,
                   viewsets.GenericViewSet):
@@ -83,9 +152,19 @@ class UserViewSet(mixins.CreateModelMixin,
 
     @action(detail=False, methods=['get'],
             permission_classes=(IsAuthenticated,),
-            pagination_class=PageNumberPagination)
+            pagination_class=LimitPageNumberPagination)
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscriber__user=request.user)
+        recipes = Recipe.objects.all()
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author'))
+                .values('pk')[:recipes_limit]
+            ))
+        queryset = (
+            User.objects.filter(subscriptions__user=request.user)
+            .prefetch_related(Prefetch('recipes', queryset=recipes))
+        )
         page = self.paginate_queryset(queryset)
         serializer = SubscribeGetSerializer(page, many=True,
                                             context={'request': request})
@@ -100,38 +179,60 @@ class UserViewSet(mixins.CreateModelMixin,
             serializer = SubscribePostSerializer(
                 author, data=request.data, context={"request": request})
             serializer.is_valid(raise_exception=True)
-            Subscribe.objects.create(user=request.user, author=author)
+            try:
+                created = interactions.add(Subscribe, request.user,
+                                           author.id)
+            except IntegrityError:
+                raise Http404
             return Response(serializer.data,
-                            status=status.HTTP_201_CREATED)
+                            status=(status.HTTP_201_CREATED if created
+                                    else status.HTTP_200_OK))
 
         if request.method == 'DELETE':
-            get_object_or_404(Subscribe, user=request.user,
-                              author=author).delete()
+            interactions.remove(Subscribe, request.user, author.id)
             return Response({'detail': 'Успешная отписка'},
                             status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,),
+            url_path='subscribe', url_name='subscribe-bulk')
+    def subscribe_bulk(self, request):
+        return bulk_change(request, Subscribe,
+                           User.objects.exclude(pk=request.user.id))
+
 
-class IngredientViewSet(mixins.ListModelMixin,
+class IngredientViewSet(ReferenceCacheMixin,
+                        mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
                         viewsets.GenericViewSet):
     queryset = Ingredient.objects.all()
     permission_classes = (AllowAny, )
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
+    reference_name = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(get_ingredient_index().search(name))
+        return super().list(request, *args, **kwargs)
 
 
-class TagViewSet(mixins.ListModelMixin,
+class TagViewSet(ReferenceCacheMixin,
+                 mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
     permission_classes = (AllowAny, )
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    reference_name = 'tags'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin,
+                    AnonymousCacheMixin,
+                    ViewerStateMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
@@ -139,16 +240,89 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = PageNumberPagination
     http_method_names = ['get', 'post', 'patch', 'create', 'delete']
 
+    @property
+    def paginator(self):
+        if (not hasattr(self, '_paginator') and self.action == 'list'
+           and self.request.query_params.get('pagination') == 'cursor'):
+            self._paginator = RecipeCursorPagination()
+        return super().paginator
+
+    def paginate_queryset(self, queryset):
+        # Курсор листает по дате, поэтому выдача, отсортированная поиском
+        # или по популярности, листается по номерам страниц.
+        if (isinstance(self.paginator, RecipeCursorPagination)
+           and not self.paginator.keeps_order(queryset)):
+            self._paginator = PageNumberPagination()
+        return super().paginate_queryset(queryset)
+
+    def get_queryset(self):
+        if self.action not in ('list', 'retrieve', 'feed', 'cookable',
+                               'recommended'):
+            return super().get_queryset()
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch('recipes', queryset=RecipeIngredient.objects
+                     .select_related('ingredient')),
+        )
+
+    def get_versions(self, *names):
+        if self.request.user.is_authenticated:
+            names += (f'viewer:{self.request.user.id}',)
+        versions = get_versions(('tags', 'ingredients') + names)
+        return tuple(sorted(versions.items()))
+
+    def get_trending_state(self, request):
+        """Наибольшая популярность рецепта для сортировки trending.
+
+        update_trending меняет trending_score запросом UPDATE, который не
+        трогает updated_at, поэтому состояние берётся из самой колонки —
+        один проход по индексу recipe_trending_idx.
+        """
+        if request.query_params.get('ordering') != 'trending':
+            return None
+        if not hasattr(self, '_trending_state'):
+            self._trending_state = Recipe.objects.aggregate(
+                score=Max('trending_score'))['score']
+        return self._trending_state
+
+    def get_cache_variant(self, request):
+        if self.action != 'list':
+            return None
+        return self.get_trending_state(request)
+
+    def get_list_state(self, request):
+        return (self.get_trending_state(request),
+                *self.get_versions('recipes', 'recipes:changes', 'authors',
+                                   'images', 'trending'))
+
+    def get_object_state(self, request):
+        if not str(self.kwargs['pk']).isdigit():
+            return None
+        return self.get_versions('authors', f'recipe:{self.kwargs["pk"]}')
+
+    def get_last_modified(self, request):
+        if self.action != 'retrieve':
+            return None
+        return (Recipe.objects.filter(pk=self.kwargs['pk'])
+                .values_list('updated_at', flat=True).first())
+
+    def get_object(self):
+        recipe = super().get_object()
+        self.last_modified = recipe.updated_at
+        return recipe
+
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action == 'cookable':
+            return CookableRecipeSerializer
+        if self.action in ('list', 'retrieve', 'feed', 'recommended'):
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
-    def add_or_remove_item(self,
-                           model_class,
-                           error_message,
-                           success_status,
-                           **kwargs):
+    def perform_destroy(self, instance):
+        with batch_recipe_changes():
+            instance.delete()
+
+    def add_or_remove_item(self, model_class, **kwargs):
         recipe = get_object_or_404(Recipe, id=kwargs['pk'])
         serializer = RecipeSerializer(recipe,
                                       data=self.request.data,
@@ -156,64 +330,146 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
 
         if self.request.method == 'POST':
-            if not model_class.objects.filter(user=self.request.user,
-                                              recipe=recipe).exists():
-                model_class.objects.create(user=self.request.user,
-                                           recipe=recipe)
-                return Response(serializer.data, status=success_status)
-            return Response({'errors': error_message},
-                            status=status.HTTP_400_BAD_REQUEST)
+            try:
+                created = interactions.add(model_class, self.request.user,
+                                           recipe.id)
+            except IntegrityError:
+                raise Http404
+            return Response(serializer.data,
+                            status=(status.HTTP_201_CREATED if created
+                                    else status.HTTP_200_OK))
 
         if self.request.method == 'DELETE':
-            obj = get_object_or_404(model_class,
-                                    user=self.request.user,
-                                    recipe=recipe)
-            obj.delete()
+            interactions.remove(model_class, self.request.user, recipe.id)
             return Response({'detail': 'Рецепт успешно удален.'},
                             status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(IsAuthenticated,))
     def favorite(self, request, **kwargs):
-        return self.add_or_remove_item(
-            FavoritesList,
-            'Рецепт уже в избранном.',
-            status.HTTP_201_CREATED,
-            **kwargs
-        )
+        return self.add_or_remove_item(FavoritesList, **kwargs)
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(IsAuthenticated,),
             pagination_class=None)
     def shopping_cart(self, request, **kwargs):
-        return self.add_or_remove_item(
-            ShoppingList,
-            'Рецепт уже в списке покупок.',
-            status.HTTP_201_CREATED,
-            **kwargs
-        )
+        return self.add_or_remove_item(ShoppingList, **kwargs)
+
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,),
+            url_path='favorite', url_name='favorite-bulk')
+    def favorite_bulk(self, request):
+        return bulk_change(request, FavoritesList, Recipe.objects.all())
+
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,),
+            url_path='shopping_cart', url_name='shopping-cart-bulk')
+    def shopping_cart_bulk(self, request):
+        return bulk_change(request, ShoppingList, Recipe.objects.all())
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(IsAuthenticated,),
+            pagination_class=RecipeCursorPagination)
+    def feed(self, request):
+        queryset = feed_queryset(self.get_queryset(), request.user)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, **kwargs):
+        """Рецепты с самыми похожими наборами ингредиентов: ?limit=10."""
+        recipe = get_object_or_404(Recipe, id=kwargs['pk'])
+        limit = request.query_params.get('limit', '')
+        limit = min(int(limit), 50) if limit.isdigit() else 10
+        matches = similarity.similar(recipe.id, limit)
+        recipes = Recipe.objects.in_bulk([pk for pk, _ in matches])
+        objects = []
+        for pk, score in matches:
+            if pk in recipes:
+                recipes[pk].similarity = round(score, 3)
+                objects.append(recipes[pk])
+        serializer = SimilarRecipeSerializer(objects, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(IsAuthenticated,),
+            pagination_class=LimitPageNumberPagination)
+    def recommended(self, request):
+        """Рекомендации, рассчитанные командой build_recommendations."""
+        queryset = (self.get_queryset()
+                    .filter(recommendations__user=request.user)
+                    .order_by('-recommendations__score', '-id'))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            pagination_class=LimitPageNumberPagination)
+    def cookable(self, request):
+        """Рецепты из имеющихся ингредиентов: ?ingredients=1&ingredients=2.
+
+        Сначала рецепты, где не хватает меньше всего ингредиентов.
+        """
+        ingredient_ids = [int(pk) for pk
+                          in request.query_params.getlist('ingredients')
+                          if pk.isdigit()]
+        matches = get_cookable_index().search(ingredient_ids)
+        page = self.paginate_queryset(matches)
+        recipes = self.get_queryset().in_bulk([pk for pk, _, _ in page])
+        objects = []
+        for pk, missing, coverage in page:
+            if pk in recipes:
+                recipe = recipes[pk]
+                recipe.missing_ingredients = missing
+                recipe.coverage = round(coverage, 3)
+                objects.append(recipe)
+        get_viewer(request).track(objects)
+        serializer = self.get_serializer(objects, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(IsAdminUser,))
+    def cache_stats(self, request):
+        return Response(get_cache_stats())
 
     @action(detail=False, methods=['get'],
             permission_classes=(IsAuthenticated,))
+    def shopping_cart_summary(self, request):
+        ingredients = (ShoppingCartIngredient.objects
+                       .filter(user=request.user)
+                       .select_related('ingredient'))
+        serializer = ShoppingCartIngredientSerializer(ingredients, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer))
     def download_shopping_cart(self, request, **kwargs):
-        ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__shopping_recipe__user=request.user)
-            .values('ingredient')
-            .annotate(total_amount=Sum('amount'))
-            .values_list(
-                'ingredient__name',
-                'total_amount',
-                'ingredient__measurement_unit'
-            )
-        )
-        file_list = ['{} - {} {}.'.format(*ingredient)
-                     for ingredient in ingredients]
-        file = HttpResponse(
-            'Cписок покупок:\n' + '\n'.join(file_list),
-            content_type='text/plain'
-        )
-        file['Content-Disposition'] = (
-            f'attachment; filename={SHOPPING_LIST_FILENAME}'
+        format = request.accepted_renderer.format
+        gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        etag = '"{}-{}-{}{}"'.format(
+            format,
+            get_version(f'shopping_cart:{request.user.id}'),
+            get_version('ingredients'),
+            '-gzip' if gzip else '',
         )
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            file = HttpResponseNotModified()
+        else:
+            content = render_shopping_list(request.user, format)
+            if gzip:
+                content = compress_sequence(content)
+            file = StreamingHttpResponse(
+                content,
+                content_type=request.accepted_renderer.media_type
+            )
+            if gzip:
+                file['Content-Encoding'] = 'gzip'
+            file['Content-Disposition'] = (
+                f'attachment; filename={SHOPPING_LIST_FILENAME}.{format}'
+            )
+        file['ETag'] = etag
+        file['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(file, ('Accept', 'Accept-Encoding'))
         return file
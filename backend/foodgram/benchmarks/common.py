@@ -0,0 +1,64 @@
+"""Общая обвязка бенчмарков.
+
+Запуск из backend/foodgram: ``python -m benchmarks.<имя> --help``.
+Бенчмарк создаёт отдельную базу, как manage.py test, заполняет её
+синтетическими данными и удаляет по завершении; рабочая база и общий
+кэш не затрагиваются.
+"""
+import argparse
+import os
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('CACHE_BACKEND',
+                      'django.core.cache.backends.locmem.LocMemCache')
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+
+def parser(description, **defaults):
+    result = argparse.ArgumentParser(description=description)
+    for name, (value, help) in defaults.items():
+        result.add_argument(f'--{name.replace("_", "-")}', type=type(value),
+                            default=value, help=help)
+    return result
+
+
+@contextmanager
+def temporary_database():
+    """Временная база со схемой приложения."""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def measure(func, repeat):
+    """Медиана и 95-й перцентиль времени вызова func, в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return (timings[len(timings) // 2],
+            timings[min(len(timings) - 1, int(len(timings) * 0.95))])
+
+
+def report(title, rows):
+    """Печатает строки (название, медиана, p95) выровненной таблицей."""
+    print(title)
+    width = max(len(name) for name, _, _ in rows)
+    print(f'  {"":{width}}  {"медиана, мс":>12}  {"p95, мс":>10}')
+    for name, median, p95 in rows:
+        print(f'  {name:{width}}  {median:12.2f}  {p95:10.2f}')
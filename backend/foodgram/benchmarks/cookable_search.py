@@ -0,0 +1,119 @@
+"""Поиск «что приготовить»: обратный индекс против GROUP BY в SQL.
+
+Сравнивает CookableIndex.search с равносильным запросом GROUP BY /
+HAVING по RecipeIngredient и замеряет догрузку индекса после изменения
+и удаления рецептов.
+"""
+import random
+from datetime import timedelta
+
+# Импортируется первым: настраивает Django.
+from benchmarks.common import (
+    measure,
+    parser,
+    report,
+    summarize,
+    temporary_database,
+)
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.cookable_index import CookableIndex
+from recipe.models import Ingredient, Recipe, RecipeIngredient, User
+
+PAGE = 10
+
+
+def create_recipes(count, generator):
+    author = User.objects.create(username='author',
+                                 email='author@example.com')
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+         for i in range(2000)])
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    # Половина рецептов собрана из 300 популярных ингредиентов.
+    popular = ingredient_ids[:300]
+    Recipe.objects.bulk_create(
+        [Recipe(author=author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10) for i in range(count)],
+        batch_size=5000,
+    )
+    RecipeIngredient.objects.bulk_create(
+        [RecipeIngredient(recipe_id=recipe_id, ingredient_id=pk, amount=1)
+         for recipe_id in Recipe.objects.values_list('id', flat=True)
+         for pk in generator.sample(
+             popular if generator.random() < 0.5 else ingredient_ids,
+             generator.randint(3, 12))],
+        batch_size=10000,
+    )
+    # Иначе все рецепты попадут в окно догрузки как только что изменённые.
+    Recipe.objects.update(updated_at=timezone.now() - timedelta(days=1))
+    return popular
+
+
+def sql_search(ingredient_ids):
+    """Та же выдача, что у CookableIndex.search, одним запросом."""
+    return list(
+        Recipe.objects.values('id')
+        .annotate(
+            total=Count('recipes'),
+            have=Count('recipes',
+                       filter=Q(recipes__ingredient__in=ingredient_ids)),
+        )
+        .filter(have__gt=0)
+        .annotate(
+            missing=F('total') - F('have'),
+            coverage=ExpressionWrapper(F('have') * 1.0 / F('total'),
+                                       output_field=FloatField()),
+        )
+        .order_by('missing', '-coverage', '-id')
+        .values_list('id', flat=True)[:PAGE]
+    )
+
+
+def main():
+    options = parser(
+        __doc__.splitlines()[0],
+        recipes=(100000, 'Число рецептов'),
+        have=(15, 'Сколько ингредиентов есть у пользователя'),
+        repeat=(20, 'Повторов каждого замера'),
+    ).parse_args()
+    generator = random.Random(1)
+    with temporary_database():
+        popular = create_recipes(options.recipes, generator)
+        have = generator.sample(popular, options.have)
+        index = CookableIndex()
+        load = measure(index.load, 1)
+        top = [pk for pk, _, _ in index.search(have)[:PAGE]]
+        assert top == sql_search(have), 'выдачи индекса и SQL разошлись'
+
+        client = APIClient()
+        client.force_authenticate(User.objects.get())
+        url = '/api/recipes/cookable/'
+        client.get(url, {'ingredients': have})
+        rows = [
+            ('CookableIndex.load', *load),
+            ('CookableIndex.search', *measure(lambda: index.search(have),
+                                              options.repeat)),
+            ('SQL GROUP BY / HAVING', *measure(lambda: sql_search(have),
+                                               options.repeat)),
+            (f'GET {url}', *measure(
+                lambda: client.get(url, {'ingredients': have}),
+                options.repeat)),
+        ]
+
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        timings = []
+        for pk in top[:-1]:
+            Recipe.objects.get(pk=generator.choice(recipe_ids)).save()
+            Recipe.objects.filter(pk=pk).delete()
+            timings.append(measure(index.refresh, 1)[0])
+        rows.append(('refresh: изменение и удаление', *summarize(timings)))
+        report(f'Рецептов: {options.recipes}, строк RecipeIngredient: '
+               f'{RecipeIngredient.objects.count()}, ингредиентов в '
+               f'запросе: {options.have}', rows)
+
+
+if __name__ == '__main__':
+    main()
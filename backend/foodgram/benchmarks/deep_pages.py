@@ -0,0 +1,85 @@
+"""Глубокие страницы списка рецептов: OFFSET против курсора.
+
+Сравнивает время первой и глубокой страницы /api/recipes/ в режимах
+?page= (COUNT и OFFSET) и ?pagination=cursor (ключ pub_date, id).
+"""
+# Импортируется первым: настраивает Django.
+from benchmarks.common import measure, parser, report, temporary_database
+from django.conf import settings
+from django.test.client import RequestFactory
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from api.pagination import RecipeCursorPagination
+from recipe.models import Ingredient, Recipe, RecipeIngredient, Tag, User
+
+
+def create_recipes(count):
+    author = User.objects.create(username='author',
+                                 email='author@example.com')
+    tags = [Tag.objects.create(name=f'Тег {i}', color='#FFFFFF',
+                               slug=f'tag{i}') for i in range(5)]
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+         for i in range(100)])
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    Recipe.objects.bulk_create(
+        [Recipe(author=author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=i % 120 + 1) for i in range(count)],
+        batch_size=5000,
+    )
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    Recipe.tags.through.objects.bulk_create(
+        [Recipe.tags.through(recipe_id=pk, tag_id=tags[pk % 5].id)
+         for pk in recipe_ids],
+        batch_size=5000,
+    )
+    RecipeIngredient.objects.bulk_create(
+        [RecipeIngredient(recipe_id=pk,
+                          ingredient_id=ingredient_ids[(pk + i) % 100],
+                          amount=i + 1)
+         for pk in recipe_ids for i in range(3)],
+        batch_size=5000,
+    )
+    return author
+
+
+def cursor_url(position):
+    """Ссылка на страницу курсора, начинающуюся после position-го рецепта."""
+    paginator = RecipeCursorPagination()
+    paginator.request = Request(
+        RequestFactory().get('/api/recipes/', {'pagination': 'cursor'}))
+    recipe = Recipe.objects.order_by('-pub_date', '-id')[position - 1]
+    return paginator.encode_cursor(recipe, reverse=False)
+
+
+def main():
+    options = parser(
+        __doc__.splitlines()[0],
+        page=(10000, 'Номер глубокой страницы'),
+        repeat=(20, 'Повторов каждого запроса'),
+    ).parse_args()
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    with temporary_database():
+        # Авторизованный клиент: анонимные ответы кэшируются.
+        client = APIClient()
+        client.force_authenticate(
+            create_recipes(page_size * (options.page + 1)))
+        deep = (options.page - 1) * page_size
+        requests = [
+            ('?page=1', '/api/recipes/?page=1'),
+            (f'?page={options.page}', f'/api/recipes/?page={options.page}'),
+            ('cursor, первая страница', '/api/recipes/?pagination=cursor'),
+            (f'cursor, страница {options.page}', cursor_url(deep)),
+        ]
+        rows = []
+        for name, url in requests:
+            assert client.get(url).status_code == 200, url
+            rows.append((name, *measure(lambda: client.get(url),
+                                        options.repeat)))
+        report(f'Рецептов: {Recipe.objects.count()}, '
+               f'на странице: {page_size}', rows)
+
+
+if __name__ == '__main__':
+    main()
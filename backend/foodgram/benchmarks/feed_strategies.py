@@ -0,0 +1,101 @@
+"""Лента подписок: раскладка при записи против сборки при чтении.
+
+Сравнивает чтение первой страницы ленты из таблицы TimelineEntry с
+запросом author__in по подпискам, а также цену раскладки одного нового
+рецепта по подписчикам автора.
+"""
+# Импортируется первым: настраивает Django.
+from benchmarks.common import measure, parser, report, temporary_database
+from rest_framework.test import APIClient
+
+from recipe import timeline
+from recipe.models import Recipe, Subscribe, TimelineEntry, User
+
+PAGE = 10
+
+
+def create_users(prefix, count):
+    User.objects.bulk_create(
+        [User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com')
+         for i in range(count)],
+        batch_size=5000,
+    )
+    return list(User.objects.filter(username__startswith=prefix)
+                .values_list('id', flat=True))
+
+
+def main():
+    options = parser(
+        __doc__.splitlines()[0],
+        authors=(1000, 'Число авторов'),
+        recipes=(100, 'Рецептов у каждого автора'),
+        follows=(500, 'На скольких авторов подписан читатель'),
+        followers=(10000, 'Подписчиков у автора нового рецепта'),
+        repeat=(20, 'Повторов каждого замера'),
+    ).parse_args()
+    with temporary_database():
+        authors = create_users('author', options.authors)
+        # Рецепты создаются по кругу, чтобы авторы чередовались по дате.
+        Recipe.objects.bulk_create(
+            [Recipe(author_id=author_id, name='Рецепт', text='Описание',
+                    cooking_time=10)
+             for _ in range(options.recipes) for author_id in authors],
+            batch_size=5000,
+        )
+        reader = User.objects.create(username='reader',
+                                     email='reader@example.com')
+        followed = authors[::max(1, len(authors) // options.follows)]
+        Subscribe.objects.bulk_create(
+            [Subscribe(user=reader, author_id=pk) for pk in followed])
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=reader, recipe_id=pk) for pk
+             in Recipe.objects.filter(author_id__in=followed)
+             .values_list('id', flat=True)],
+            batch_size=5000,
+        )
+
+        def first_page(feed):
+            return lambda: list(feed().order_by('-pub_date', '-id')
+                                .values_list('id', flat=True)[:PAGE])
+
+        on_read = first_page(lambda: Recipe.objects.filter(
+            author__in=Subscribe.objects.filter(user=reader)
+            .values('author_id')))
+        on_write = first_page(lambda: timeline.feed_queryset(
+            Recipe.objects.all(), reader))
+        assert on_read() == on_write()
+        client = APIClient()
+        client.force_authenticate(reader)
+        rows = [
+            ('чтение: author__in', *measure(on_read, options.repeat)),
+            ('чтение: TimelineEntry', *measure(on_write, options.repeat)),
+            ('GET /api/recipes/feed/', *measure(
+                lambda: client.get('/api/recipes/feed/'), options.repeat)),
+        ]
+
+        author = User.objects.create(username='popular',
+                                     email='popular@example.com')
+        Subscribe.objects.bulk_create(
+            [Subscribe(user_id=pk, author=author)
+             for pk in create_users('follower', options.followers)],
+            batch_size=5000,
+        )
+        User.objects.filter(pk=author.pk).update(
+            subscribers_count=options.followers)
+        recipe = Recipe.objects.create(author=author, name='Новый рецепт',
+                                       text='Описание', cooking_time=10)
+
+        def fan_out():
+            # Замер включает удаление записей предыдущего прогона.
+            TimelineEntry.objects.filter(recipe=recipe).delete()
+            timeline.fan_out(recipe)
+
+        rows.append((f'запись: fan_out на {options.followers}',
+                     *measure(fan_out, max(1, options.repeat // 4))))
+        report(f'Рецептов: {Recipe.objects.count()}, подписок читателя: '
+               f'{len(followed)}, записей ленты: '
+               f'{TimelineEntry.objects.filter(user=reader).count()}', rows)
+
+
+if __name__ == '__main__':
+    main()
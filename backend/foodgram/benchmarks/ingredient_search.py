@@ -0,0 +1,64 @@
+"""Автодополнение ингредиентов: индекс в памяти против LIKE в базе.
+
+Сравнивает ответ ``/api/ingredients/?name=`` из IngredientIndex с
+прежним путём — фильтром name__istartswith по таблице ингредиентов.
+"""
+import io
+import random
+
+# Импортируется первым: настраивает Django.
+from benchmarks.common import measure, parser, report, temporary_database
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from api.ingredient_index import get_ingredient_index
+from recipe.models import Ingredient
+
+
+def main():
+    options = parser(
+        __doc__.splitlines()[0],
+        copies=(1, 'Сколько раз размножить справочник из data/'),
+        queries=(200, 'Число поисковых запросов'),
+    ).parse_args()
+    with temporary_database():
+        call_command('load_ingredients', stdout=io.StringIO())
+        base = list(Ingredient.objects.values_list('name',
+                                                   'measurement_unit'))
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=f'{name} {copy}', measurement_unit=unit)
+             for copy in range(1, options.copies)
+             for name, unit in base],
+            batch_size=5000,
+        )
+        names = [name for name, _ in base]
+        generator = random.Random(1)
+        queries = [
+            generator.choice(names)[:generator.randint(1, 5)]
+            for _ in range(options.queries)
+        ]
+        index = get_ingredient_index()
+        client = APIClient()
+
+        def run(search):
+            cycle = iter(queries * 2)
+            return measure(lambda: search(next(cycle)), len(queries))
+
+        rows = [
+            ('IngredientIndex.search', *run(index.search)),
+            ('+ проверка метки версии', *run(
+                lambda query: get_ingredient_index().search(query))),
+            ('name__istartswith', *run(
+                lambda query: list(
+                    Ingredient.objects.filter(name__istartswith=query)
+                    .values('id', 'name', 'measurement_unit')))),
+            ('GET ?name= (индекс)', *run(
+                lambda query: client.get('/api/ingredients/',
+                                         {'name': query}))),
+        ]
+        report(f'Ингредиентов: {Ingredient.objects.count()}, '
+               f'запросов: {len(queries)}', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,13 @@
 import os
+import sys
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-SHOPPING_LIST_FILENAME = 'shopping_list.txt'
+SHOPPING_LIST_FILENAME = 'shopping_list'
 FORBIDDEN_USERNAMES = ('me',)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -72,6 +74,39 @@ DATABASES = {
     }
 }
 
+# Кэш должен быть общим для всех процессов приложения и команд управления,
+# поэтому кэш в памяти процесса не подходит. Метки версий и счётчики лежат
+# в отдельном кэше без вытеснения: при переполнении кэша ответов файловый
+# бэкенд удаляет случайную треть записей, и вместе с ними пропадали бы
+# метки, от которых зависят ETag и индексы в памяти.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    default='django.core.cache.backends.filebased.FileBasedCache'
+)
+CACHE_LOCATION = os.getenv(
+    'CACHE_LOCATION',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=50000)),
+        },
+    },
+    'persistent': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION + '_persistent',
+        'OPTIONS': {
+            'MAX_ENTRIES': sys.maxsize,
+        },
+    },
+}
+
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+ANONYMOUS_CACHE_TIMEOUT = 60 * 10
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -103,6 +138,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+# Автор с числом подписчиков больше TIMELINE_FANOUT_LIMIT переводится на
+# сборку ленты при чтении, а обратно — только когда подписчиков станет не
+# больше TIMELINE_FANOUT_RESUME_LIMIT, чтобы режим не менялся на границе.
+TIMELINE_FANOUT_LIMIT = 10000
+TIMELINE_FANOUT_RESUME_LIMIT = 5000
+TIMELINE_WORKERS = int(os.getenv('TIMELINE_WORKERS', default=2))
+TIMELINE_BACKFILL = 100
+
+BULK_ACTION_LIMIT = 100
+
+RECOMMENDATIONS_LIMIT = 50
+
+TRENDING_HALF_LIFE_HOURS = 48
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_CART_WEIGHT = 0.5
+
 AUTH_USER_MODEL = 'recipe.User'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from . import shopping_cart
 from .models import (
     User,
     Subscribe,
@@ -7,6 +9,8 @@ from .models import (
     Recipe,
     RecipeIngredient,
     FavoritesList,
+    Recommendation,
+    ShoppingCartIngredient,
     ShoppingList
 )
 
@@ -21,6 +25,8 @@ class UserAdmin(admin.ModelAdmin):
         'is_superuser',
         'first_name',
         'last_name',
+        'recipes_count',
+        'subscribers_count',
     )
     list_editable = ('password', )
     list_filter = ('username', 'email')
@@ -76,6 +82,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'text',
         'cooking_time',
         'in_favorites',
+        'in_carts_count',
     )
     list_editable = (
         'name',
@@ -89,11 +96,13 @@ class RecipeAdmin(admin.ModelAdmin):
 
     @admin.display(description='В избранном')
     def in_favorites(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
 
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
+    """Правки строк сразу переносятся в списки покупок с этим рецептом."""
+
     list_display = (
         'pk',
         'recipe',
@@ -106,6 +115,27 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
         'amount',
     )
 
+    @staticmethod
+    def row(queryset):
+        return queryset.values_list('recipe_id', 'ingredient_id', 'amount')
+
+    def save_model(self, request, obj, form, change):
+        old = (self.row(RecipeIngredient.objects.filter(pk=obj.pk)).first()
+               if change else None)
+        super().save_model(request, obj, form, change)
+        shopping_cart.change_rows(
+            old, (obj.recipe_id, obj.ingredient_id, obj.amount))
+
+    def delete_model(self, request, obj):
+        shopping_cart.change_rows(
+            (obj.recipe_id, obj.ingredient_id, obj.amount), None)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for row in self.row(queryset):
+            shopping_cart.change_rows(row, None)
+        super().delete_queryset(request, queryset)
+
 
 @admin.register(FavoritesList)
 class FavoritesListAdmin(admin.ModelAdmin):
@@ -131,3 +161,25 @@ class ShoppingListAdmin(admin.ModelAdmin):
         'user',
         'recipe',
     )
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'user',
+        'ingredient',
+        'amount',
+    )
+    list_filter = ('user',)
+
+
+@admin.register(Recommendation)
+class RecommendationAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'user',
+        'recipe',
+        'score',
+    )
+    list_filter = ('user',)
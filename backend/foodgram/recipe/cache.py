@@ -0,0 +1,48 @@
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.connection import ConnectionProxy
+
+# Кэш без вытеснения: метки версий и счётчики не должны пропадать
+# при переполнении кэша ответов.
+persistent_cache = ConnectionProxy(caches, 'persistent')
+
+VERSION_KEY = 'version:{}'
+
+
+def get_version(name):
+    key = VERSION_KEY.format(name)
+    version = persistent_cache.get(key)
+    if version is None:
+        persistent_cache.add(key, time.time_ns(), None)
+        version = persistent_cache.get(key)
+    return version
+
+
+def bump_version(name):
+    key = VERSION_KEY.format(name)
+    try:
+        return persistent_cache.incr(key)
+    except ValueError:
+        persistent_cache.set(key, time.time_ns(), None)
+        return persistent_cache.get(key)
+
+
+def get_versions(names):
+    keys = {VERSION_KEY.format(name): name for name in names}
+    versions = persistent_cache.get_many(list(keys))
+    for key in keys:
+        if key not in versions:
+            persistent_cache.add(key, time.time_ns(), None)
+            versions[key] = persistent_cache.get(key)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_versions(*names):
+    for name in set(names):
+        bump_version(name)
+
+
+def bump_on_commit(*names):
+    transaction.on_commit(lambda: bump_versions(*names))
@@ -0,0 +1,98 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1200,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANTS_DIR = 'recipes/variants'
+
+_executor = None
+_lock = threading.Lock()
+
+
+def variant_name(name, variant, extension):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{VARIANTS_DIR}/{stem}-{variant}.{extension}'
+
+
+def render_variants(source, media_root, name):
+    """Сохраняет уменьшенные копии без метаданных. Выполняется в воркере.
+
+    Имя исходника — хэш содержимого, поэтому готовая копия не устаревает
+    и исходник декодируется, только если какой-то копии нет. Возвращает
+    ширину каждой копии: thumbnail не увеличивает картинку и сохраняет
+    пропорции, так что она бывает меньше размера варианта.
+    """
+    widths = {}
+    missing = {}
+    for variant in VARIANTS:
+        for extension in FORMATS:
+            path = os.path.join(media_root,
+                                variant_name(name, variant, extension))
+            if not os.path.exists(path):
+                missing.setdefault(variant, []).append((extension, path))
+            elif variant not in widths:
+                # Размер берётся из заголовка, без декодирования.
+                with Image.open(path) as existing:
+                    widths[variant] = existing.width
+    if not missing:
+        return widths
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P')
+                              else 'RGB')
+        for variant, targets in missing.items():
+            resized = image.copy()
+            resized.thumbnail((VARIANTS[variant], VARIANTS[variant]),
+                              Image.LANCZOS)
+            widths[variant] = resized.width
+            for extension, path in targets:
+                format, options = FORMATS[extension]
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                output = (resized if format == 'WEBP'
+                          else resized.convert('RGB'))
+                temporary = f'{path}.{os.getpid()}.tmp'
+                output.save(temporary, format, **options)
+                os.replace(temporary, path)
+    return widths
+
+
+def get_executor(workers):
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _executor
+
+
+def process_image(source, media_root, name, workers, on_done):
+    if not workers:
+        on_done(render_variants(source, media_root, name))
+        return
+
+    def done(future):
+        if future.exception() is not None:
+            logger.error('Не удалось обработать изображение %s', name,
+                         exc_info=future.exception())
+        else:
+            on_done(future.result())
+
+    future = get_executor(workers).submit(render_variants, source,
+                                          media_root, name)
+    future.add_done_callback(done)
@@ -0,0 +1,138 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import shopping_cart, timeline
+from .cache import bump_on_commit
+from .models import FavoritesList, Recipe, ShoppingList, Subscribe, User
+
+
+def increment(model, pks, field, delta):
+    rows = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    rows.update(**{field: F(field) + delta})
+
+
+def interactions_changed(user_id):
+    User.objects.filter(pk=user_id).update(
+        interactions_changed_at=timezone.now())
+    bump_on_commit(f'viewer:{user_id}')
+
+
+def favorites_changed(user_id, recipe_ids, delta):
+    increment(Recipe, recipe_ids, 'favorites_count', delta)
+    interactions_changed(user_id)
+
+
+def shopping_cart_changed(user_id, recipe_ids, delta):
+    if delta > 0:
+        shopping_cart.add_recipes(user_id, recipe_ids)
+    else:
+        shopping_cart.remove_recipes(user_id, recipe_ids)
+    increment(Recipe, recipe_ids, 'in_carts_count', delta)
+    interactions_changed(user_id)
+
+
+def subscriptions_changed(user_id, author_ids, delta):
+    increment(User, author_ids, 'subscribers_count', delta)
+    timeline.update_mode(author_ids, delta)
+    for author_id in author_ids:
+        if delta > 0:
+            timeline.backfill(user_id, author_id)
+        else:
+            timeline.trim(user_id, author_id)
+    bump_on_commit(f'viewer:{user_id}')
+
+
+HANDLERS = {
+    FavoritesList: ('recipe_id', favorites_changed),
+    ShoppingList: ('recipe_id', shopping_cart_changed),
+    Subscribe: ('author_id', subscriptions_changed),
+}
+
+
+def lock_user(user):
+    # Пакетные операции сначала читают существующие связи, поэтому все
+    # изменения связей одного пользователя выполняются по очереди.
+    User.objects.select_for_update().filter(pk=user.id).exists()
+
+
+def delete_rows(model, user, field, ids):
+    """Удаляет связи одним DELETE без сигналов; возвращает число строк.
+
+    Сигналы не нужны: вызывающий применяет изменения сам одним пакетом.
+    """
+    quote = connection.ops.quote_name
+    opts = model._meta
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM {} WHERE {} = %s AND {} IN ({})'.format(
+                quote(opts.db_table),
+                quote(opts.get_field('user').column),
+                quote(opts.get_field(field).column),
+                ', '.join(['%s'] * len(ids)),
+            ),
+            [user.id, *ids],
+        )
+        return cursor.rowcount
+
+
+def add(model, user, pk):
+    """Добавляет связь одним INSERT; False, если она уже была.
+
+    IntegrityError без существующей связи — нарушение внешнего ключа:
+    объект удалили одновременно с запросом. Такая ошибка пробрасывается.
+    """
+    field, changed = HANDLERS[model]
+    try:
+        with transaction.atomic():
+            lock_user(user)
+            model.objects.bulk_create([model(user=user, **{field: pk})])
+            changed(user.id, [pk], 1)
+    except IntegrityError:
+        if model.objects.filter(user=user, **{field: pk}).exists():
+            return False
+        raise
+    return True
+
+
+def remove(model, user, pk):
+    """Удаляет связь одним DELETE; False, если её не было."""
+    field, changed = HANDLERS[model]
+    with transaction.atomic():
+        lock_user(user)
+        deleted = delete_rows(model, user, field, [pk])
+        if deleted:
+            changed(user.id, [pk], -1)
+    return bool(deleted)
+
+
+@transaction.atomic
+def bulk_add(model, user, ids):
+    """Добавляет связи пользователя пакетом; возвращает новые id."""
+    field, changed = HANDLERS[model]
+    lock_user(user)
+    existing = set(model.objects.filter(user=user, **{f'{field}__in': ids})
+                   .values_list(field, flat=True))
+    created = [pk for pk in dict.fromkeys(ids) if pk not in existing]
+    model.objects.bulk_create(
+        [model(user=user, **{field: pk}) for pk in created],
+        ignore_conflicts=True,
+    )
+    if created:
+        changed(user.id, created, 1)
+    return created
+
+
+@transaction.atomic
+def bulk_remove(model, user, ids):
+    """Удаляет связи пользователя пакетом; возвращает удалённые id."""
+    field, changed = HANDLERS[model]
+    lock_user(user)
+    deleted = list(model.objects.filter(user=user, **{f'{field}__in': ids})
+                   .values_list(field, flat=True))
+    if deleted:
+        changed(user.id, deleted, -1)
+        delete_rows(model, user, field, deleted)
+    return deleted
@@ -0,0 +1,121 @@
+import resource
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from scipy import sparse
+
+from recipe.models import FavoritesList, Recommendation, ShoppingList, User
+
+
+def interaction_matrix():
+    """Бинарная матрица пользователь × рецепт по избранному и корзине."""
+    pairs = np.array(
+        list(FavoritesList.objects.values_list('user_id', 'recipe_id'))
+        + list(ShoppingList.objects.values_list('user_id', 'recipe_id')),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    user_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    recipe_ids, cols = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (rows, cols)),
+        shape=(len(user_ids), len(recipe_ids)),
+    )
+    matrix.data[:] = 1
+    return matrix, user_ids, recipe_ids
+
+
+def top_recipes(matrix, target_rows, limit, block_size):
+    """Лучшие рецепты для строк target_rows по item-item косинусу.
+
+    Матрица сходства рецептов считается блоками по block_size столбцов,
+    поэтому целиком в памяти она не хранится.
+    """
+    norms = np.sqrt(np.asarray(matrix.sum(axis=0)).ravel())
+    normalized = (matrix @ sparse.diags(1 / norms)).tocsc()
+    normalized_t = normalized.T.tocsr()
+    targets = matrix[target_rows]
+    best_scores = np.zeros((len(target_rows), limit), dtype=np.float32)
+    best_cols = np.full((len(target_rows), limit), -1, dtype=np.int64)
+    for start in range(0, matrix.shape[1], block_size):
+        stop = min(start + block_size, matrix.shape[1])
+        similarity = normalized_t @ normalized[:, start:stop]
+        for first in range(0, len(target_rows), block_size):
+            last = first + block_size
+            scores = np.asarray(
+                (targets[first:last] @ similarity).todense(),
+                dtype=np.float32,
+            )
+            seen = targets[first:last, start:stop].nonzero()
+            scores[seen] = 0
+            scores = np.hstack((best_scores[first:last], scores))
+            cols = np.hstack((
+                best_cols[first:last],
+                np.broadcast_to(np.arange(start, stop),
+                                (len(scores), stop - start)),
+            ))
+            top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+            best_scores[first:last] = np.take_along_axis(scores, top, axis=1)
+            best_cols[first:last] = np.take_along_axis(cols, top, axis=1)
+    return best_scores, best_cols
+
+
+class Command(BaseCommand):
+    help = ('Расчёт рекомендаций рецептов по избранному и спискам покупок '
+            'для пользователей, у которых они изменились.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать для всех пользователей')
+        parser.add_argument('--block-size', type=int, default=2000,
+                            help='Размер блока матрицы сходства')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        run_at = timezone.now()
+        users = User.objects.filter(interactions_changed_at__isnull=False)
+        if not options['full']:
+            users = users.filter(
+                Q(recommended_at__isnull=True)
+                | Q(interactions_changed_at__gt=F('recommended_at'))
+            )
+        target_ids = list(users.values_list('id', flat=True))
+        if not target_ids:
+            self.stdout.write(self.style.SUCCESS('Изменений нет.'))
+            return
+
+        matrix, user_ids, recipe_ids = interaction_matrix()
+        target_rows = np.flatnonzero(np.isin(user_ids, target_ids))
+        recommendations = []
+        if len(target_rows) and len(recipe_ids):
+            limit = min(settings.RECOMMENDATIONS_LIMIT, len(recipe_ids))
+            scores, cols = top_recipes(matrix, target_rows, limit,
+                                       options['block_size'])
+            for row, user_scores, user_cols in zip(target_rows, scores,
+                                                   cols):
+                for score, col in zip(user_scores, user_cols):
+                    if score > 0:
+                        recommendations.append(Recommendation(
+                            user_id=int(user_ids[row]),
+                            recipe_id=int(recipe_ids[col]),
+                            score=float(score),
+                        ))
+
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=target_ids).delete()
+            Recommendation.objects.bulk_create(recommendations,
+                                               batch_size=1000)
+            User.objects.filter(pk__in=target_ids).update(
+                recommended_at=run_at)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(target_ids)}, '
+            f'рекомендаций: {len(recommendations)}, '
+            f'матрица {matrix.shape[0]}×{matrix.shape[1]}, '
+            f'время: {time.perf_counter() - started:.1f} с, '
+            f'пик памяти: {peak:.0f} МБ.'
+        ))
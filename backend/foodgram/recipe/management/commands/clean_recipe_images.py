@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe.images import FORMATS, VARIANTS, VARIANTS_DIR, variant_name
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Удаление файлов изображений, '
+            'на которые не ссылается ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help='Не трогать файлы моложе N секунд')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        referenced = set()
+        for name in (Recipe.objects.exclude(image='')
+                     .values_list('image', flat=True).iterator()):
+            referenced.add(name)
+            referenced.update(
+                variant_name(name, variant, extension)
+                for variant in VARIANTS for extension in FORMATS
+            )
+
+        threshold = time.time() - options['min_age']
+        removed = freed = 0
+        for directory in ('recipes', VARIANTS_DIR):
+            if not storage.exists(directory):
+                continue
+            for filename in storage.listdir(directory)[1]:
+                name = f'{directory}/{filename}'
+                path = storage.path(name)
+                if name in referenced or os.path.getmtime(path) > threshold:
+                    continue
+                removed += 1
+                freed += os.path.getsize(path)
+                if not options['dry_run']:
+                    storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Будет удалено" if options["dry_run"] else "Удалено"} '
+            f'файлов: {removed} ({freed / 1024 / 1024:.1f} МБ).'
+        ))
@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipe.cache import bump_version
+from recipe.models import Ingredient
+
+DEFAULT_PATH = os.path.join(settings.BASE_DIR, '..', '..',
+                            'data', 'ingredients.csv')
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) == 2:
+            yield row
+
+
+def read_json(file):
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив ингредиентов.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON-файл.')
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item.get('name'), item.get('measurement_unit')
+
+
+def clean(rows):
+    for name, measurement_unit in rows:
+        name = (name or '').strip()
+        measurement_unit = (measurement_unit or '').strip()
+        if name and measurement_unit:
+            yield name, measurement_unit
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+class Command(BaseCommand):
+    help = 'Загрузка ингредиентов из CSV- или JSON-файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=DEFAULT_PATH,
+                            help='Путь к ingredients.csv или ingredients.json')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Не использовать COPY на PostgreSQL')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        reader = read_json if path.endswith('.json') else read_csv
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
+        load = self.copy_batch if use_copy else self.insert_batch
+
+        start = time.monotonic()
+        before = Ingredient.objects.count()
+        read = 0
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            for batch in batches(clean(reader(file)),
+                                 options['batch_size']):
+                load(batch)
+                read += len(batch)
+        created = Ingredient.objects.count() - before
+        if created:
+            bump_version('ingredients')
+        elapsed = max(time.monotonic() - start, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {read}, добавлено {created} ингредиентов '
+            f'за {elapsed:.2f} с ({read / elapsed:.0f} строк/с).'
+        ))
+
+    def insert_batch(self, batch):
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=measurement_unit)
+             for name, measurement_unit in batch],
+            ignore_conflicts=True,
+        )
+
+    def copy_batch(self, batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS ingredient_load '
+                '(name varchar(255), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_load (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit FROM ingredient_load '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            cursor.execute('TRUNCATE ingredient_load')
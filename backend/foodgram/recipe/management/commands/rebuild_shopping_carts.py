@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipe.cache import bump_version
+from recipe.models import RecipeIngredient, ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт агрегированных списков покупок '
+            'по рецептам в корзинах пользователей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только проверить, ничего не исправляя')
+
+    def handle(self, *args, **options):
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in
+            RecipeIngredient.objects
+            .filter(recipe__shopping_recipe__isnull=False)
+            .values('recipe__shopping_recipe__user', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .values_list('recipe__shopping_recipe__user', 'ingredient',
+                         'total')
+            .order_by()
+        }
+        actual = {
+            (row.user_id, row.ingredient_id): row
+            for row in ShoppingCartIngredient.objects.order_by()
+        }
+        stale = [row.pk for key, row in actual.items()
+                 if key not in expected]
+        changed = []
+        for key, row in actual.items():
+            if key in expected and row.amount != expected[key]:
+                row.amount = expected[key]
+                changed.append(row)
+        missing = [
+            ShoppingCartIngredient(user_id=user_id,
+                                   ingredient_id=ingredient_id,
+                                   amount=amount)
+            for (user_id, ingredient_id), amount in expected.items()
+            if (user_id, ingredient_id) not in actual
+        ]
+        summary = (f'лишних: {len(stale)}, неверных: {len(changed)}, '
+                   f'отсутствующих: {len(missing)}')
+
+        if options['check']:
+            if stale or changed or missing:
+                raise CommandError(f'Обнаружены расхождения ({summary}).')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+
+        with transaction.atomic():
+            ShoppingCartIngredient.objects.filter(pk__in=stale).delete()
+            ShoppingCartIngredient.objects.bulk_update(changed, ['amount'],
+                                                       batch_size=1000)
+            ShoppingCartIngredient.objects.bulk_create(missing,
+                                                       batch_size=1000)
+        for user_id in {user_id for user_id, _ in expected} | {
+                row.user_id for row in actual.values()}:
+            bump_version(f'shopping_cart:{user_id}')
+        self.stdout.write(self.style.SUCCESS(f'Исправлено ({summary}).'))
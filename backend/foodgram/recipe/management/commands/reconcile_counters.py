@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipe.models import (
+    FavoritesList,
+    Recipe,
+    ShoppingList,
+    Subscribe,
+    User,
+)
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoritesList, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingList, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscribe, 'author'),
+)
+
+
+def live_count(model, field):
+    return Coalesce(Subquery(
+        model.objects
+        .filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), Value(0))
+
+
+class Command(BaseCommand):
+    help = 'Сверка и исправление счётчиков рецептов и пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        for model, counter, source, field in COUNTERS:
+            rows = model.objects.exclude(
+                **{counter: live_count(source, field)})
+            drift = rows.count()
+            if drift and not options['check']:
+                rows.update(**{counter: live_count(source, field)})
+            self.stdout.write(
+                f'{model.__name__}.{counter}: расхождений {drift}'
+            )
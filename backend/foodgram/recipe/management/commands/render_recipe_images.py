@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe.images import render_variants
+from recipe.models import Recipe
+from recipe.signals import variants_rendered
+
+
+class Command(BaseCommand):
+    help = ('Создание недостающих копий картинок рецептов '
+            'и запись их ширины для srcset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Обработать и рецепты с записанной шириной')
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        recipes = (Recipe.objects.exclude(image='')
+                   .values_list('id', 'image', 'image_widths').iterator())
+        processed = 0
+        for recipe_id, name, widths in recipes:
+            if widths and not options['all']:
+                continue
+            if not storage.exists(name):
+                self.stderr.write(f'Нет файла картинки рецепта {recipe_id}.')
+                continue
+            variants_rendered(recipe_id, name, render_variants(
+                storage.path(name), settings.MEDIA_ROOT, name))
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {processed}.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipe import search
+from recipe.models import Recipe
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Пересборка поискового индекса рецептов.'
+
+    def handle(self, *args, **options):
+        search.setup()
+        recipe_ids = list(Recipe.objects.order_by('id')
+                          .values_list('id', flat=True))
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            search.update(recipe_ids[start:start + BATCH_SIZE])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {len(recipe_ids)}.'))
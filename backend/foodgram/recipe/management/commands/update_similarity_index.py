@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipe import similarity
+from recipe.models import Recipe
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт сигнатур MinHash и полос LSH для похожих рецептов.'
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.order_by('id')
+                          .values_list('id', flat=True))
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            similarity.update(recipe_ids[start:start + BATCH_SIZE])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {len(recipe_ids)}.'))
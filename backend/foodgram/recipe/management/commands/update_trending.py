@@ -0,0 +1,54 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Case, FloatField, Value, When
+from django.utils import timezone
+
+from recipe.cache import bump_version
+from recipe.models import FavoritesList, Recipe, ShoppingList
+
+# Добавления старше стольких периодов полураспада дают меньше 0.1% веса.
+HORIZON_HALF_LIVES = 10
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт популярности рецептов по добавлениям в избранное '
+            'и в списки покупок с затуханием по времени.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Рецептов в одном UPDATE')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        half_life = timedelta(hours=settings.TRENDING_HALF_LIFE_HOURS)
+        horizon = now - half_life * HORIZON_HALF_LIVES
+        scores = defaultdict(float)
+        for model, weight in (
+                (FavoritesList, settings.TRENDING_FAVORITE_WEIGHT),
+                (ShoppingList, settings.TRENDING_CART_WEIGHT)):
+            added = (model.objects.filter(created_at__gte=horizon)
+                     .values_list('recipe_id', 'created_at')
+                     .iterator(chunk_size=5000))
+            for recipe_id, created_at in added:
+                scores[recipe_id] += weight * 0.5 ** (
+                    (now - created_at) / half_life)
+        for recipe_id in (Recipe.objects.filter(trending_score__gt=0)
+                          .values_list('id', flat=True)):
+            scores.setdefault(recipe_id, 0)
+
+        items = sorted(scores.items())
+        batch_size = options['batch_size']
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            Recipe.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                trending_score=Case(
+                    *(When(pk=pk, then=Value(score)) for pk, score in batch),
+                    output_field=FloatField(),
+                )
+            )
+        bump_version('trending')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлена популярность рецептов: {len(items)}.'))
@@ -1,7 +1,12 @@
+from datetime import timedelta
+
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 
 class User(AbstractUser):
     email = models.EmailField(
@@ -10,6 +15,31 @@ class User(AbstractUser):
         verbose_name='Адрес электронной почты'
     )
     password = models.CharField(max_length=150, verbose_name='Пароль')
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков'
+    )
+    timeline_fanned_out = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name='Рецепты раскладываются по лентам подписчиков'
+    )
+    interactions_changed_at = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name='Изменение избранного или корзины'
+    )
+    recommended_at = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name='Расчёт рекомендаций'
+    )
 
     class Meta:
         ordering = ('id',)
@@ -57,6 +87,12 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -94,6 +130,13 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeManager(models.Manager):
+    """Не читает служебные колонки поиска: они нужны только в SQL."""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector', 'minhash')
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -104,9 +147,15 @@ class Recipe(models.Model):
     name = models.CharField(max_length=255, verbose_name='Название')
     image = models.ImageField(
         upload_to='recipes/',
+        storage=ContentAddressedStorage(),
         blank=True,
         verbose_name='Картинка'
     )
+    image_widths = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Ширина копий картинки'
+    )
     text = models.TextField(verbose_name='Текст')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -127,11 +176,60 @@ class Recipe(models.Model):
         db_index=True,
         verbose_name='Дата публикации',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый документ'
+    )
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Популярность'
+    )
+    minhash = models.BinaryField(
+        null=True,
+        editable=False,
+        verbose_name='Сигнатура MinHash ингредиентов'
+    )
+
+    objects = RecipeManager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Сигналы сравнивают с ним картинку, чтобы не обрабатывать её
+        # заново при каждом сохранении рецепта.
+        instance.loaded_image = dict(zip(field_names, values)).get('image')
+        return instance
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['pub_date', 'id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['cooking_time'],
+                         name='recipe_cooking_time_idx'),
+            models.Index(fields=['trending_score', 'pub_date', 'id'],
+                         name='recipe_trending_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -185,6 +283,11 @@ class FavoritesList(models.Model):
         related_name='favorite_recipe',
         verbose_name='Рецепт в избранном'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -213,6 +316,11 @@ class ShoppingList(models.Model):
         related_name='shopping_recipe',
         verbose_name='Рецепт в корзине'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -226,3 +334,140 @@ class ShoppingList(models.Model):
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(verbose_name='Количество')
+
+    class Meta:
+        ordering = ['ingredient__name']
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return (f'{self.user.username}: '
+                f'{self.ingredient.name} - '
+                f'{self.amount} '
+                f'{self.ingredient.measurement_unit}')
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.recipe.name}'
+
+
+class Recommendation(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        ordering = ['-score']
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_recommendation'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.recipe.name}'
+
+
+class RecipeBand(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='bands',
+        verbose_name='Рецепт'
+    )
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса')
+    bucket = models.BigIntegerField(verbose_name='Корзина')
+
+    class Meta:
+        verbose_name = 'Полоса LSH'
+        verbose_name_plural = 'Полосы LSH'
+        indexes = [
+            models.Index(fields=['band', 'bucket'],
+                         name='recipe_band_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.band} - {self.bucket}'
+
+
+class RecipeDeletion(models.Model):
+    """Отметка об удалении рецепта для индексов в памяти процессов.
+
+    По ней индекс узнаёт об удалениях без просмотра всех id рецептов.
+    Отметки старше RETENTION удаляются.
+    """
+
+    RETENTION = timedelta(days=1)
+
+    recipe_id = models.PositiveBigIntegerField(verbose_name='Рецепт')
+    deleted_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата удаления',
+    )
+
+    class Meta:
+        verbose_name = 'Удалённый рецепт'
+        verbose_name_plural = 'Удалённые рецепты'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.deleted_at}'
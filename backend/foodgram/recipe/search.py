@@ -0,0 +1,121 @@
+"""Полнотекстовый поиск рецептов.
+
+На PostgreSQL документ хранится в колонке Recipe.search_vector с
+GIN-индексом (конфигурация russian). На SQLite вместо неё используется
+виртуальная таблица FTS5 recipe_search, чтобы поиск работал локально
+без внешних сервисов.
+"""
+from django.db import connection, connections
+from django.db.models import OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe, RecipeIngredient
+
+CONFIG = 'russian'
+FTS_TABLE = 'recipe_search'
+
+
+def is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def setup(using='default', **kwargs):
+    """Создаёт индекс поиска; вызывается после миграций."""
+    db = connections[using]
+    if db.vendor not in ('postgresql', 'sqlite'):
+        return
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+                'ON recipe_recipe USING gin (search_vector)'
+            )
+        else:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING '
+                "fts5(name, ingredients, text, tokenize='unicode61')"
+            )
+
+
+def ingredient_names(recipe_ids):
+    names = {}
+    for recipe_id, name in (RecipeIngredient.objects
+                            .filter(recipe_id__in=recipe_ids)
+                            .values_list('recipe_id', 'ingredient__name')):
+        names.setdefault(recipe_id, []).append(name)
+    return {pk: ' '.join(items) for pk, items in names.items()}
+
+
+def update(recipe_ids):
+    """Пересобирает поисковый документ рецептов."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if is_postgres():
+        from django.contrib.postgres.aggregates import StringAgg
+        from django.contrib.postgres.search import SearchVector
+
+        ingredients = Subquery(
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+            .values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names')
+        )
+        Recipe.objects.filter(pk__in=recipe_ids).update(search_vector=(
+            SearchVector('name', weight='A', config=CONFIG)
+            + SearchVector(ingredients, weight='B', config=CONFIG)
+            + SearchVector('text', weight='C', config=CONFIG)
+        ))
+        return
+    if connection.vendor != 'sqlite':
+        return
+    names = ingredient_names(recipe_ids)
+    rows = [(pk, name, names.get(pk, ''), text) for pk, name, text
+            in Recipe.objects.filter(pk__in=recipe_ids)
+            .values_list('id', 'name', 'text')]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({{}})'.format(
+                ', '.join(['%s'] * len(recipe_ids))),
+            recipe_ids,
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+            'VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def match_query(query):
+    # Каждое слово ищется как префикс, операторы FTS5 экранируются.
+    return ' '.join('"{}"*'.format(word.replace('"', '""'))
+                    for word in query.split())
+
+
+def search(queryset, query):
+    """Оставляет рецепты, подходящие под запрос, от более релевантных."""
+    if not query.split():
+        return queryset
+    if is_postgres():
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(query, config=CONFIG,
+                                   search_type='websearch')
+        return (queryset.filter(search_vector=search_query)
+                .annotate(search_rank=SearchRank('search_vector',
+                                                 search_query))
+                        .order_by('-search_rank', '-pub_date', '-id'))
+    if connection.vendor != 'sqlite':
+        return queryset.filter(name__icontains=query)
+    query = match_query(query)
+    return (
+        queryset
+        .filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (query,)))
+        .annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 5.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = recipe_recipe.id',
+            (query,)))
+        .order_by('-search_rank', '-pub_date', '-id')
+    )
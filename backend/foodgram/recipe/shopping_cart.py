@@ -0,0 +1,70 @@
+from collections import defaultdict
+
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .cache import bump_version
+from .models import RecipeIngredient, ShoppingCartIngredient, ShoppingList
+
+
+def apply_delta(user_ids, deltas):
+    """Прибавляет deltas ({ingredient_id: amount}) к спискам покупок."""
+    user_ids = list(user_ids)
+    deltas = {pk: amount for pk, amount in deltas.items() if amount}
+    if not user_ids or not deltas:
+        return
+    ShoppingCartIngredient.objects.bulk_create(
+        [ShoppingCartIngredient(user_id=user_id, ingredient_id=pk, amount=0)
+         for user_id in user_ids for pk in deltas],
+        ignore_conflicts=True,
+    )
+    rows = ShoppingCartIngredient.objects.filter(user_id__in=user_ids,
+                                                 ingredient_id__in=deltas)
+    rows.update(amount=F('amount') + Case(
+        *[When(ingredient_id=pk, then=Value(amount))
+          for pk, amount in deltas.items()],
+        output_field=IntegerField(),
+    ))
+    rows.filter(amount__lte=0).delete()
+    for user_id in user_ids:
+        bump_version(f'shopping_cart:{user_id}')
+
+
+def recipe_amounts(recipe_ids):
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values('ingredient_id')
+        .annotate(total=Sum('amount'))
+        .values_list('ingredient_id', 'total')
+        .order_by()
+    )
+
+
+def add_recipes(user_id, recipe_ids):
+    apply_delta([user_id], recipe_amounts(recipe_ids))
+
+
+def remove_recipes(user_id, recipe_ids):
+    apply_delta([user_id], {pk: -amount for pk, amount
+                            in recipe_amounts(recipe_ids).items()})
+
+
+def change_recipe(user_ids, old_amounts, new_amounts):
+    apply_delta(user_ids, {
+        pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+        for pk in set(old_amounts) | set(new_amounts)
+    })
+
+
+def change_rows(old, new):
+    """Переносит в списки покупок замену строки RecipeIngredient.
+
+    old и new — (recipe_id, ingredient_id, amount) или None.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for row, sign in ((old, -1), (new, 1)):
+        if row is not None:
+            recipe_id, ingredient_id, amount = row
+            deltas[recipe_id][ingredient_id] += sign * amount
+    for recipe_id, delta in deltas.items():
+        apply_delta(ShoppingList.objects.filter(recipe_id=recipe_id)
+                    .values_list('user_id', flat=True), delta)
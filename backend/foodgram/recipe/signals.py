@@ -0,0 +1,222 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import images, search, similarity, timeline
+from .cache import bump_on_commit, bump_version, bump_versions
+from .interactions import (
+    favorites_changed,
+    increment,
+    shopping_cart_changed,
+    subscriptions_changed,
+)
+from .models import (
+    FavoritesList,
+    Ingredient,
+    Recipe,
+    RecipeDeletion,
+    RecipeIngredient,
+    ShoppingList,
+    Subscribe,
+    Tag,
+    User,
+)
+
+
+_batch = threading.local()
+
+
+def touch_recipes(recipe_ids):
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+def reindex_on_commit(recipe_ids):
+    if getattr(_batch, 'reindex', None) is not None:
+        _batch.reindex.update(recipe_ids)
+        return
+
+    def reindex():
+        search.update(recipe_ids)
+        similarity.update(recipe_ids)
+    transaction.on_commit(reindex)
+
+
+def recipe_contents_changed(recipe_ids):
+    touch_recipes(recipe_ids)
+    bump_on_commit('recipes:changes', *(f'recipe:{pk}' for pk in recipe_ids))
+    reindex_on_commit(recipe_ids)
+
+
+@contextmanager
+def batch_recipe_changes():
+    """Применяет изменения строк RecipeIngredient один раз на блок.
+
+    Иначе каждая добавленная или удалённая строка отдельно обновляет
+    рецепт и ставит свою переиндексацию после коммита.
+    """
+    if getattr(_batch, 'reindex', None) is not None:
+        yield
+        return
+    _batch.reindex, _batch.touched = set(), set()
+    try:
+        yield
+        reindex, touched = _batch.reindex, _batch.touched
+    finally:
+        _batch.reindex = _batch.touched = None
+    if touched:
+        recipe_contents_changed(touched)
+    if reindex - touched:
+        reindex_on_commit(reindex - touched)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    if not created:
+        recipe_ids = list(RecipeIngredient.objects.filter(ingredient=instance)
+                          .values_list('recipe_id', flat=True))
+        transaction.on_commit(lambda: search.update(recipe_ids))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(**kwargs):
+    bump_version('tags')
+
+
+@receiver(post_save, sender=ShoppingList)
+def shopping_list_created(instance, created, **kwargs):
+    if created:
+        shopping_cart_changed(instance.user_id, [instance.recipe_id], 1)
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def shopping_list_deleted(instance, **kwargs):
+    shopping_cart_changed(instance.user_id, [instance.recipe_id], -1)
+
+
+@receiver(post_save, sender=FavoritesList)
+def favorite_created(instance, created, **kwargs):
+    if created:
+        favorites_changed(instance.user_id, [instance.recipe_id], 1)
+
+
+@receiver(post_delete, sender=FavoritesList)
+def favorite_deleted(instance, **kwargs):
+    favorites_changed(instance.user_id, [instance.recipe_id], -1)
+
+
+def image_changed(instance, created, update_fields):
+    if not instance.image:
+        return False
+    if update_fields is not None and 'image' not in update_fields:
+        return False
+    return created or instance.image.name != getattr(
+        instance, 'loaded_image', None)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created, update_fields, **kwargs):
+    names = [f'recipe:{instance.id}', 'recipes:changes']
+    if created:
+        increment(User, [instance.author_id], 'recipes_count', 1)
+        names += [f'author:{instance.author_id}', 'recipes']
+        transaction.on_commit(lambda: timeline.run_in_background(
+            timeline.fan_out, instance))
+    bump_on_commit(*names)
+    reindex_on_commit([instance.id])
+    if image_changed(instance, created, update_fields):
+        instance.loaded_image = instance.image.name
+        if instance.image_widths:
+            # Ширины относятся к прежней картинке.
+            instance.image_widths = {}
+            Recipe.objects.filter(pk=instance.id).update(image_widths={})
+        recipe_id, name = instance.id, instance.image.name
+        transaction.on_commit(lambda: images.process_image(
+            instance.image.path, settings.MEDIA_ROOT, name,
+            settings.IMAGE_WORKERS,
+            lambda widths: variants_rendered(recipe_id, name, widths),
+        ))
+
+
+def variants_rendered(recipe_id, name, widths):
+    """Запоминает ширины копий, если картинка рецепта не сменилась."""
+    if Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_widths=widths):
+        bump_versions(f'recipe:{recipe_id}', 'images')
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(instance, **kwargs):
+    bump_on_commit(
+        f'recipe:{instance.id}', f'author:{instance.author_id}',
+        'recipes', 'recipes:changes',
+        *(f'tag:{slug}' for slug
+          in instance.tags.values_list('slug', flat=True)),
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    increment(User, [instance.author_id], 'recipes_count', -1)
+    RecipeDeletion.objects.filter(
+        deleted_at__lt=timezone.now() - RecipeDeletion.RETENTION).delete()
+    RecipeDeletion.objects.create(recipe_id=instance.id)
+    reindex_on_commit([instance.id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        recipe_ids = pk_set or list(
+            instance.recipe_set.values_list('id', flat=True))
+        slugs = [instance.slug]
+    else:
+        recipe_ids = [instance.id]
+        tags = Tag.objects.filter(pk__in=pk_set) if pk_set else instance.tags
+        slugs = tags.values_list('slug', flat=True)
+    touch_recipes(recipe_ids)
+    bump_on_commit('recipes:changes',
+                   *(f'recipe:{pk}' for pk in recipe_ids),
+                   *(f'tag:{slug}' for slug in slugs))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(instance, **kwargs):
+    if getattr(_batch, 'touched', None) is not None:
+        _batch.touched.add(instance.recipe_id)
+        return
+    recipe_contents_changed([instance.recipe_id])
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_on_commit(f'author:{instance.id}', 'authors')
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribe_created(instance, created, **kwargs):
+    if created:
+        subscriptions_changed(instance.user_id, [instance.author_id], 1)
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscribe_deleted(instance, **kwargs):
+    subscriptions_changed(instance.user_id, [instance.author_id], -1)
@@ -0,0 +1,112 @@
+"""Похожие рецепты: MinHash по наборам ингредиентов и LSH-индекс.
+
+Сигнатура рецепта — NUM_HASHES минимумов хэш-функций по id его
+ингредиентов; доля совпавших позиций двух сигнатур оценивает
+коэффициент Жаккара. Сигнатура режется на BANDS полос, и рецепты с
+совпавшей полосой становятся кандидатами, так что для поиска не нужно
+сравнивать рецепт со всеми остальными.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Recipe, RecipeBand, RecipeIngredient
+
+NUM_HASHES = 128
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+PRIME = (1 << 31) - 1
+MAX_CANDIDATES = 200
+
+_random = np.random.RandomState(20240521)
+_A = _random.randint(1, PRIME, size=NUM_HASHES).astype(np.int64)
+_B = _random.randint(0, PRIME, size=NUM_HASHES).astype(np.int64)
+
+
+def signatures(ingredient_sets):
+    """Сигнатуры MinHash для списка наборов id, одним вызовом NumPy."""
+    sizes = np.array([len(items) for items in ingredient_sets])
+    values = np.fromiter((pk for items in ingredient_sets for pk in items),
+                         dtype=np.int64, count=int(sizes.sum()))
+    hashes = (np.outer(values % PRIME, _A) + _B) % PRIME
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    result = np.full((len(ingredient_sets), NUM_HASHES), PRIME,
+                     dtype=np.uint32)
+    filled = sizes > 0
+    if filled.any():
+        result[filled] = np.minimum.reduceat(hashes, starts[filled], axis=0)
+    return result
+
+
+def band_buckets(signature_rows):
+    """Номер корзины для каждой полосы каждой сигнатуры."""
+    rows = signature_rows.reshape(len(signature_rows), BANDS, ROWS)
+    buckets = np.zeros(rows.shape[:2], dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for column in range(ROWS):
+            buckets = (buckets * np.uint64(1000003)
+                       + rows[:, :, column].astype(np.uint64))
+    return buckets.view(np.int64)
+
+
+@transaction.atomic
+def update(recipe_ids):
+    """Пересчитывает сигнатуры и полосы LSH для рецептов."""
+    recipe_ids = list(Recipe.objects.filter(pk__in=list(recipe_ids))
+                      .values_list('id', flat=True))
+    RecipeBand.objects.filter(recipe_id__in=recipe_ids).delete()
+    if not recipe_ids:
+        return
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id in (RecipeIngredient.objects
+                                     .filter(recipe_id__in=recipe_ids)
+                                     .values_list('recipe_id',
+                                                  'ingredient_id')):
+        ingredients[recipe_id].append(ingredient_id)
+    recipe_ids = [pk for pk in recipe_ids if ingredients[pk]]
+    rows = signatures([ingredients[pk] for pk in recipe_ids])
+    buckets = band_buckets(rows)
+    recipes = [Recipe(pk=pk, minhash=row.tobytes())
+               for pk, row in zip(recipe_ids, rows)]
+    Recipe.objects.bulk_update(recipes, ['minhash'], batch_size=1000)
+    RecipeBand.objects.bulk_create(
+        [RecipeBand(recipe_id=pk, band=band, bucket=int(bucket))
+         for pk, recipe_buckets in zip(recipe_ids, buckets)
+         for band, bucket in enumerate(recipe_buckets)],
+        batch_size=5000,
+    )
+
+
+def similar(recipe_id, limit):
+    """Пары (id рецепта, оценка Жаккара) по убыванию сходства."""
+    bands = list(RecipeBand.objects.filter(recipe_id=recipe_id)
+                 .values_list('band', 'bucket'))
+    if not bands:
+        return []
+    query = Q()
+    for band, bucket in bands:
+        query |= Q(band=band, bucket=bucket)
+    candidates = list(
+        RecipeBand.objects.filter(query)
+        .exclude(recipe_id=recipe_id)
+        .values('recipe_id')
+        .annotate(matches=Count('id'))
+        .order_by('-matches')
+        .values_list('recipe_id', flat=True)[:MAX_CANDIDATES]
+    )
+    if not candidates:
+        return []
+    signatures_by_id = dict(
+        Recipe.objects.filter(pk__in=candidates + [recipe_id])
+        .values_list('id', 'minhash')
+    )
+    own = np.frombuffer(signatures_by_id.pop(recipe_id), dtype=np.uint32)
+    ids = list(signatures_by_id)
+    matrix = np.frombuffer(b''.join(bytes(signatures_by_id[pk])
+                                    for pk in ids),
+                           dtype=np.uint32).reshape(len(ids), NUM_HASHES)
+    scores = (matrix == own).mean(axis=1)
+    order = np.argsort(-scores, kind='stable')[:limit]
+    return [(ids[position], float(scores[position])) for position in order]
@@ -0,0 +1,28 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла — SHA-256 его содержимого.
+
+    Повторная загрузка тех же байтов не создаёт новый файл, а файлы
+    никогда не перезаписываются и могут кэшироваться бессрочно.
+    """
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        extension = os.path.splitext(name)[1].lower()
+        name = os.path.join(os.path.dirname(name),
+                            f'{digest.hexdigest()}{extension}')
+        if self.exists(name):
+            # Обновляем mtime, чтобы clean_recipe_images не удалил файл,
+            # на который вот-вот сошлётся новый рецепт.
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
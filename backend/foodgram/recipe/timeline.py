@@ -0,0 +1,148 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+
+from .models import Recipe, Subscribe, TimelineEntry, User
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor(workers):
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='timeline')
+    return _executor
+
+
+def run(task, *args):
+    try:
+        task(*args)
+    except Exception:
+        logger.exception('Не удалось обновить ленты подписчиков')
+    finally:
+        connections.close_all()
+
+
+def run_in_background(task, *args):
+    """Выполняет раскладку вне запроса; без воркеров — сразу."""
+    workers = settings.TIMELINE_WORKERS
+    if not workers:
+        task(*args)
+        return
+    get_executor(workers).submit(run, task, *args)
+
+
+def is_fanned_out(author_id):
+    return User.objects.filter(pk=author_id,
+                               timeline_fanned_out=True).exists()
+
+
+def insert_entries(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def followers(author_id):
+    return (Subscribe.objects.filter(author_id=author_id)
+            .values_list('user_id', flat=True)
+            .iterator(chunk_size=BATCH_SIZE))
+
+
+def fan_out(recipe):
+    """Раскладывает новый рецепт по лентам подписчиков автора."""
+    with transaction.atomic():
+        # Блокировка дожидается resume_fan_out: иначе рецепт, созданный
+        # во время возврата автора к раскладке, не попал бы ни в одну ленту.
+        if not User.objects.select_for_update().filter(
+                pk=recipe.author_id, timeline_fanned_out=True).exists():
+            return
+    insert_entries(
+        TimelineEntry(user_id=user_id, recipe_id=recipe.id)
+        for user_id in followers(recipe.author_id)
+    )
+
+
+@transaction.atomic
+def resume_fan_out(author_id):
+    """Возвращает автора к раскладке, заполнив ленты всех подписчиков."""
+    if not User.objects.select_for_update().filter(
+            pk=author_id,
+            timeline_fanned_out=False,
+            subscribers_count__lte=settings.TIMELINE_FANOUT_RESUME_LIMIT,
+    ).exists():
+        return
+    recipe_ids = list(Recipe.objects.filter(author_id=author_id)
+                      .values_list('id', flat=True)
+                      [:settings.TIMELINE_BACKFILL])
+    insert_entries(
+        TimelineEntry(user_id=user_id, recipe_id=pk)
+        for user_id in followers(author_id) for pk in recipe_ids
+    )
+    User.objects.filter(pk=author_id).update(timeline_fanned_out=True)
+
+
+def update_mode(author_ids, delta):
+    """Переключает авторов между раскладкой и сборкой ленты при чтении."""
+    if delta > 0:
+        User.objects.filter(
+            pk__in=author_ids,
+            timeline_fanned_out=True,
+            subscribers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+        ).update(timeline_fanned_out=False)
+        return
+    resumed = User.objects.filter(
+        pk__in=author_ids,
+        timeline_fanned_out=False,
+        subscribers_count__lte=settings.TIMELINE_FANOUT_RESUME_LIMIT,
+    ).values_list('id', flat=True)
+    for author_id in resumed:
+        transaction.on_commit(lambda author_id=author_id: run_in_background(
+            resume_fan_out, author_id))
+
+
+def backfill(user_id, author_id):
+    if not is_fanned_out(author_id):
+        return
+    recipe_ids = (Recipe.objects.filter(author_id=author_id)
+                  .values_list('id', flat=True)
+                  [:settings.TIMELINE_BACKFILL])
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, recipe_id=pk) for pk in recipe_ids],
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 recipe__author_id=author_id).delete()
+
+
+def feed_queryset(queryset, user):
+    """Лента: записи из таблицы плюс рецепты авторов без раскладки."""
+    popular_authors = list(Subscribe.objects.filter(
+        user=user,
+        author__timeline_fanned_out=False,
+    ).values_list('author_id', flat=True))
+    if not popular_authors:
+        return queryset.filter(timeline_entries__user=user)
+    return queryset.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user)
+          .values('recipe_id'))
+        | Q(author_id__in=popular_authors)
+    )
@@ -0,0 +1,96 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.testcases import skipUnlessDBFeature
+from rest_framework.test import APIClient
+
+from recipe.management.commands.reconcile_counters import COUNTERS, live_count
+from recipe.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartIngredient,
+    ShoppingList,
+    User,
+)
+from recipe.shopping_cart import recipe_amounts
+
+LOCMEM_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'persistent': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'persistent',
+    },
+}
+WORKERS = 16
+REQUESTS = 400
+
+
+@override_settings(CACHES=LOCMEM_CACHE, TIMELINE_WORKERS=0)
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentToggleTest(TransactionTestCase):
+    """Одиночные и пакетные переключения из параллельных запросов."""
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        self.user = User.objects.create(username='viewer',
+                                        email='viewer@example.com')
+        author = User.objects.create(username='author',
+                                     email='author@example.com')
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(3)
+        ]
+        self.recipe_ids = []
+        for i in range(5):
+            recipe = Recipe.objects.create(author=author, name=f'Рецепт {i}',
+                                           text='Описание', cooking_time=5)
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=i + 1)
+                for ingredient in ingredients[:i % 3 + 1]
+            ])
+            self.recipe_ids.append(recipe.id)
+
+    def toggle(self, seed):
+        generator = random.Random(seed)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        endpoint = generator.choice(('favorite', 'shopping_cart'))
+        method = generator.choice((client.post, client.delete))
+        try:
+            if generator.random() < 0.5:
+                pk = generator.choice(self.recipe_ids)
+                response = method(f'/api/recipes/{pk}/{endpoint}/')
+            else:
+                response = method(
+                    f'/api/recipes/{endpoint}/',
+                    {'ids': generator.sample(self.recipe_ids, 3)},
+                    format='json',
+                )
+            return response.status_code
+        finally:
+            connection.close()
+
+    def test_counters_match_rows(self):
+        with ThreadPoolExecutor(WORKERS) as pool:
+            statuses = set(pool.map(self.toggle, range(REQUESTS)))
+        self.assertLessEqual(statuses, {200, 201, 204})
+
+        for model, counter, source, field in COUNTERS:
+            with self.subTest(counter=f'{model.__name__}.{counter}'):
+                self.assertFalse(model.objects.exclude(
+                    **{counter: live_count(source, field)}).exists())
+
+        in_cart = ShoppingList.objects.filter(
+            user=self.user).values_list('recipe_id', flat=True)
+        self.assertEqual(
+            dict(ShoppingCartIngredient.objects.filter(user=self.user)
+                 .values_list('ingredient_id', 'amount')),
+            recipe_amounts(list(in_cart)),
+        )
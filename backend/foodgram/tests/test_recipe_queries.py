@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipe.models import (
+    FavoritesList,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+    Subscribe,
+    Tag,
+    User,
+)
+
+PAGE_SIZE = settings.REST_FRAMEWORK['PAGE_SIZE']
+LOCMEM_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'persistent': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'persistent',
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RecipeQueriesTest(TestCase):
+    """Число запросов к базе не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='viewer',
+                                       email='viewer@example.com')
+        authors = [
+            User.objects.create(username=f'author{i}',
+                                email=f'author{i}@example.com')
+            for i in range(3)
+        ]
+        tags = [
+            Tag.objects.create(name=f'Тег {i}', color='#FFFFFF',
+                               slug=f'tag{i}')
+            for i in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(4)
+        ]
+        for i in range(PAGE_SIZE + 1):
+            recipe = Recipe.objects.create(
+                author=authors[i % len(authors)], name=f'Рецепт {i}',
+                text='Описание', cooking_time=10 + i,
+            )
+            recipe.tags.set(tags)
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=i + 1)
+                for ingredient in ingredients
+            ])
+            if i % 2:
+                FavoritesList.objects.create(user=cls.user, recipe=recipe)
+            else:
+                ShoppingList.objects.create(user=cls.user, recipe=recipe)
+        Subscribe.objects.create(user=cls.user, author=authors[0])
+        cls.recipe = recipe
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        self.anonymous = APIClient()
+        self.authorized = APIClient()
+        self.authorized.force_authenticate(self.user)
+
+    def get(self, client, url, queries, **params):
+        for backend in caches.all():
+            backend.clear()
+        with self.assertNumQueries(queries):
+            response = client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list(self):
+        # Страница, количество, теги и ингредиенты; для пользователя ещё
+        # подписки, избранное и корзина — по одному запросу на страницу.
+        for client, queries in ((self.anonymous, 4), (self.authorized, 7)):
+            for page, size in ((1, PAGE_SIZE), (2, 1)):
+                with self.subTest(queries=queries, size=size):
+                    data = self.get(client, '/api/recipes/', queries,
+                                    page=page)
+                    self.assertEqual(len(data['results']), size)
+
+    def test_cursor_list(self):
+        for client, queries in ((self.anonymous, 3), (self.authorized, 6)):
+            for limit in (1, PAGE_SIZE):
+                with self.subTest(queries=queries, limit=limit):
+                    data = self.get(client, '/api/recipes/', queries,
+                                    pagination='cursor', limit=limit)
+                    self.assertEqual(len(data['results']), limit)
+
+    def test_retrieve(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.get(self.anonymous, url, 3)
+        data = self.get(self.authorized, url, 6)
+        self.assertTrue(data['is_favorited'])
+        self.assertFalse(data['is_in_shopping_cart'])
+
+    def test_cursor_keeps_ordering(self):
+        oldest = Recipe.objects.order_by('pub_date', 'id').first()
+        Recipe.objects.filter(pk=oldest.pk).update(trending_score=1)
+        data = self.anonymous.get('/api/recipes/', {
+            'ordering': 'trending', 'pagination': 'cursor'}).json()
+        self.assertEqual(data['results'][0]['id'], oldest.id)
+        self.assertEqual(data['count'], PAGE_SIZE + 1)
+
+    def test_flags(self):
+        data = self.get(self.authorized, '/api/recipes/', 7)
+        favorites = set(FavoritesList.objects.filter(user=self.user)
+                        .values_list('recipe_id', flat=True))
+        for item in data['results']:
+            self.assertEqual(item['is_favorited'], item['id'] in favorites)
+            self.assertNotEqual(item['is_favorited'],
+                                item['is_in_shopping_cart'])
+            self.assertEqual(item['author']['is_subscribed'],
+                             item['author']['username'] == 'author0')
+
+    def test_anonymous_cache_hit(self):
+        self.get(self.anonymous, '/api/recipes/', 4)
+        with self.assertNumQueries(0):
+            response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_anonymous_cache_hit_last_modified(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        miss = self.anonymous.get(url)
+        hit = self.anonymous.get(url)
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual(hit['Last-Modified'], miss['Last-Modified'])
+
+    def test_not_modified(self):
+        for client in (self.anonymous, self.authorized):
+            with self.subTest(authorized=client is self.authorized):
+                etag = client.get('/api/recipes/')['ETag']
+                with self.assertNumQueries(0):
+                    response = client.get('/api/recipes/',
+                                          HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
@@ -0,0 +1,68 @@
+from django.contrib.admin.sites import site
+from django.test import RequestFactory, TestCase
+
+from recipe.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartIngredient,
+    ShoppingList,
+    User,
+)
+from recipe.shopping_cart import recipe_amounts
+
+
+class RecipeIngredientAdminTest(TestCase):
+    """Правки ингредиентов рецепта в админке меняют списки покупок."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='viewer',
+                                        email='viewer@example.com')
+        author = User.objects.create(username='author',
+                                     email='author@example.com')
+        self.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(3)
+        ]
+        self.recipes = [
+            Recipe.objects.create(author=author, name=f'Рецепт {i}',
+                                  text='Описание', cooking_time=10)
+            for i in range(2)
+        ]
+        for recipe in self.recipes:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=self.ingredients[0], amount=10)
+            ShoppingList.objects.create(user=self.user, recipe=recipe)
+        self.admin = site._registry[RecipeIngredient]
+        self.request = RequestFactory().post('/')
+
+    def assertCartMatchesRecipes(self):
+        self.assertEqual(
+            dict(ShoppingCartIngredient.objects.filter(user=self.user)
+                 .values_list('ingredient_id', 'amount')),
+            recipe_amounts([recipe.id for recipe in self.recipes]),
+        )
+
+    def test_save_and_delete(self):
+        row = RecipeIngredient.objects.get(recipe=self.recipes[0])
+        row.amount = 25
+        row.ingredient = self.ingredients[1]
+        self.admin.save_model(self.request, row, None, True)
+        self.assertCartMatchesRecipes()
+
+        row = RecipeIngredient(recipe=self.recipes[1],
+                               ingredient=self.ingredients[2], amount=5)
+        self.admin.save_model(self.request, row, None, False)
+        self.assertCartMatchesRecipes()
+
+        row.recipe = self.recipes[0]
+        self.admin.save_model(self.request, row, None, True)
+        self.assertCartMatchesRecipes()
+
+        self.admin.delete_model(self.request, row)
+        self.assertCartMatchesRecipes()
+        self.admin.delete_queryset(
+            self.request, RecipeIngredient.objects.filter(
+                recipe=self.recipes[1]))
+        self.assertCartMatchesRecipes()
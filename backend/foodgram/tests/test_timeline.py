@@ -0,0 +1,52 @@
+from django.test import TestCase, override_settings
+
+from recipe import interactions, timeline
+from recipe.models import Recipe, Subscribe, TimelineEntry, User
+
+
+@override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_FANOUT_RESUME_LIMIT=1,
+                   TIMELINE_WORKERS=0)
+class FanOutModeTest(TestCase):
+    """Рецепты автора не пропадают из лент при смене режима раскладки."""
+
+    def setUp(self):
+        self.author = User.objects.create(username='author',
+                                          email='author@example.com')
+        self.followers = [
+            User.objects.create(username=f'follower{i}',
+                                email=f'follower{i}@example.com')
+            for i in range(3)
+        ]
+
+    def subscribe(self, user, delta):
+        change = interactions.add if delta > 0 else interactions.remove
+        with self.captureOnCommitCallbacks(execute=True):
+            change(Subscribe, user, self.author.id)
+        self.author.refresh_from_db()
+
+    def feed(self, user):
+        return list(timeline.feed_queryset(Recipe.objects.all(), user)
+                    .values_list('id', flat=True))
+
+    def test_switches_with_hysteresis(self):
+        for user in self.followers:
+            self.subscribe(user, 1)
+        self.assertFalse(self.author.timeline_fanned_out)
+
+        recipe = Recipe.objects.create(author=self.author, name='Рецепт',
+                                       text='Описание', cooking_time=10)
+        timeline.fan_out(recipe)
+        self.assertFalse(TimelineEntry.objects.filter(recipe=recipe).exists())
+        self.assertEqual(self.feed(self.followers[0]), [recipe.id])
+
+        # На границе лимита автор остаётся без раскладки.
+        self.subscribe(self.followers[2], -1)
+        self.assertFalse(self.author.timeline_fanned_out)
+        self.assertEqual(self.feed(self.followers[0]), [recipe.id])
+
+        self.subscribe(self.followers[1], -1)
+        self.assertTrue(self.author.timeline_fanned_out)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.followers[0], recipe=recipe).exists())
+        self.assertEqual(self.feed(self.followers[0]), [recipe.id])
+        self.assertEqual(self.feed(self.followers[1]), [])